@@ -0,0 +1,143 @@
+"""Классификация вещей на больших каталогах: построчный перебор против автомата,
+плюс нечёткий поиск по опечаткам и проверка списков вещей одним проходом
+
+Вердикты не сравниваются: автомат работает по основам слов, перебор — по подстрокам.
+
+Перед замерами прогоняются контрольные случаи на ключевых словах из config.json;
+при расхождении скрипт завершается с ненулевым кодом.
+
+Запуск: python -m benchmarks.item_checker [--keywords 10000] [--messages 2000]
+"""
+import argparse
+import random
+import sys
+import time
+
+from services import settings
+from services.item_checker import ItemChecker, split_items
+
+# (текст, ожидаемый статус) на ключевых словах из config.json
+REGRESSION_CASES = [
+    ("бензин", "prohibited"),
+    ("канистра с бензином", "prohibited"),
+    ("диван", "allowed"),
+    # сложные слова с запрещённой основой, которые ловил прежний поиск подстрок
+    ("лакокрасочные материалы", "prohibited"),
+    ("ядохимикаты", "prohibited"),
+    ("хлорорганика", "prohibited"),
+    # короткие основы не должны находиться внутри других слов
+    ("ядро", "unknown"),
+    ("лакомство", "unknown"),
+    # похожее написание — только подсказка, не запрет
+    ("живопись", "unknown"),
+    ("бензн", "unknown"),
+]
+
+LETTERS = "абвгдежзийклмнопрстуфхцчшщыэюя"
+
+
+def random_word(rng, low=4, high=12):
+    return "".join(rng.choice(LETTERS) for _ in range(rng.randint(low, high)))
+
+
+def naive_classify(text, prohibited, allowed):
+    """Прежний алгоритм check_item: `kw in text` по каждому слову каждого списка"""
+    text = text.lower()
+    if [kw for kw in prohibited if kw in text]:
+        return "prohibited"
+    if [kw for kw in allowed if kw in text]:
+        return "allowed"
+    return "unknown"
+
+
+def check_regressions() -> int:
+    config = settings.current()
+    checker = ItemChecker(config.prohibited_keywords, config.allowed_keywords, dict(config.prohibited_reasons))
+    failures = 0
+    for text, expected in REGRESSION_CASES:
+        verdict = checker.classify(text)
+        if verdict.status != expected:
+            failures += 1
+            print(f"FAIL «{text}»: ожидали {expected}, получили {verdict.status} ({verdict.keyword})")
+    print(f"Контрольных случаев: {len(REGRESSION_CASES)}, расхождений: {failures}")
+    return failures
+
+
+def main():
+    if check_regressions():
+        sys.exit(1)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keywords", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    prohibited = [random_word(rng) for _ in range(args.keywords // 2)]
+    allowed = [random_word(rng) for _ in range(args.keywords - len(prohibited))]
+    vocabulary = prohibited + allowed
+    messages = [
+        " ".join(rng.choice(vocabulary) if rng.random() < 0.2 else random_word(rng) for _ in range(8))
+        for _ in range(args.messages)
+    ]
+
+    started = time.perf_counter()
+    checker = ItemChecker(prohibited, allowed, {})
+    build = time.perf_counter() - started
+
+    # сюда входит и нечёткий поиск для сообщений без точных совпадений
+    started = time.perf_counter()
+    for text in messages:
+        checker.classify(text)
+    automaton = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for text in messages:
+        naive_classify(text, prohibited, allowed)
+    naive = time.perf_counter() - started
+
+    # опечатки: одна замена буквы в словах словаря — точный поиск промахивается, работает триграммный индекс
+    typos = []
+    for _ in range(args.messages):
+        word = list(rng.choice(vocabulary))
+        word[rng.randrange(len(word))] = rng.choice(LETTERS)
+        typos.append("".join(word))
+
+    started = time.perf_counter()
+    guessed = sum(checker.classify(text).guess for text in typos)
+    fuzzy = time.perf_counter() - started
+
+    # списки вещей через запятую: по одному classify на вещь против одного прохода classify_items
+    inventories = [
+        ", ".join(
+            f"{rng.randint(1, 30)} {rng.choice(vocabulary)}" if rng.random() < 0.5 else rng.choice(vocabulary)
+            for _ in range(20)
+        )
+        for _ in range(args.messages // 10)
+    ]
+
+    started = time.perf_counter()
+    for text in inventories:
+        [checker.classify(name) for _, name in split_items(text)]
+    per_item = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for text in inventories:
+        checker.classify_items(text)
+    batch = time.perf_counter() - started
+
+    per_message = lambda seconds: seconds / len(messages) * 1e6
+    per_inventory = lambda seconds: seconds / len(inventories) * 1e6
+    print(f"Ключевых слов: {args.keywords}, сообщений: {args.messages}")
+    print(f"Сборка автомата: {build * 1000:.0f} мс")
+    print(f"Перебор: {per_message(naive):.0f} мкс/сообщение")
+    print(f"Автомат: {per_message(automaton):.0f} мкс/сообщение ({naive / automaton:.0f}x)")
+    print(f"Опечатки: {per_message(fuzzy):.0f} мкс/слово, угадано {guessed} из {len(typos)}")
+    print(
+        f"Списки по 20 вещей: по одной {per_inventory(per_item):.0f} мкс/список, "
+        f"одним проходом {per_inventory(batch):.0f} мкс/список"
+    )
+
+
+if __name__ == "__main__":
+    main()
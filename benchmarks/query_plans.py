@@ -0,0 +1,144 @@
+"""Проверка планов запросов repository.py: ни один из них не должен сканировать таблицу целиком,
+а горячие запросы должны идти по своим индексам
+
+Запуск: python -m benchmarks.query_plans
+Скрипт поднимает временную базу, прогоняет миграции и вызывает функции
+репозитория, снимая EXPLAIN QUERY PLAN с каждого SELECT/UPDATE/DELETE.
+При полном сканировании или неиспользованном обязательном индексе
+завершается с кодом 1 — так проверку можно запускать в CI.
+"""
+import asyncio
+import datetime
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DB_PATH"] = str(Path(_tmp.name) / "plans.sqlite3")
+
+from sqlalchemy import event  # noqa: E402
+
+from database import repository  # noqa: E402
+from database.models import Base  # noqa: E402
+from database.init_db import init_db  # noqa: E402
+from database.session import engine  # noqa: E402
+from services import promo_index  # noqa: E402
+
+# Выборка всей таблицы по смыслу — для неё SCAN ожидаем
+FULL_LISTINGS = {"get_all_orders"}
+
+# индексы, ради которых они заводились (достаточно любого из множества): если запрос
+# перестал их использовать (индекс потерялся в миграции или планировщик выбрал другой) — это ошибка
+REQUIRED_INDEXES = {
+    "get_user_orders": {"ix_orders_user_id"},
+    "get_orders_for_delivery": {"ix_orders_delivery_queue"},
+    "get_orders_page": {"ix_orders_status_id"},
+    "get_orders_in_storage": {"ix_orders_status_end_date"},
+    "get_expired_orders": {"ix_orders_status_end_date"},
+    "get_expired_status_orders": {"ix_orders_status_id", "ix_orders_status_end_date"},
+    "get_promo_stats": {"ix_orders_promo_code"},
+    "redeem_promo": {"ix_orders_user_id"},
+    "get_valid_promo": {"ix_promo_codes_max_uses"},
+    "send_due_reminders": {"ix_orders_status_end_date"},
+    "expire_overdue_orders": {"ix_orders_status_end_date"},
+    "dispose_abandoned_orders": {"ix_orders_status_end_date"},
+    "purge_fsm_records": {"ix_fsm_states_updated_at"},
+}
+
+# «SCAN t USING INDEX ...» — тоже проход по всей таблице, просто в порядке индекса
+FULL_SCAN = re.compile(r"^SCAN (\w+)( USING .*)?$")
+INDEX_USED = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+plans = []
+current_call = "init_db"
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _explain(conn, cursor, statement, parameters, context, executemany):
+    if executemany or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+        return
+    explain_cursor = conn.connection.cursor()
+    explain_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    details = [row[3] for row in explain_cursor.fetchall()]
+    explain_cursor.close()
+    plans.append((current_call, " ".join(statement.split())[:80], details))
+
+
+async def call(name, *args, **kwargs):
+    global current_call
+    current_call = name
+    module = repository if hasattr(repository, name) else promo_index
+    return await getattr(module, name)(*args, **kwargs)
+
+
+async def main():
+    await init_db()
+    today = datetime.date.today()
+
+    user_id, _ = await call("get_or_create_user", 1)
+    order = await call(
+        "create_order", user_id, "Бенчмарк", "small", "Доставка", "+70000000000", 1500,
+        start_date=today, end_date=today, promo_code="storage15",
+        email="bench@example.com", is_delivery_required=True
+    )
+
+    await call("get_order_by_id", order.id)
+    await call("get_user_orders", user_id)
+    await call("get_all_orders")
+    await call("get_orders_for_delivery")
+    await call("get_orders_page")
+    await call("get_orders_page", before_id=order.id)
+    await call("get_orders_page", after_id=order.id)
+    await call("get_orders_in_storage")
+    await call("get_expired_orders")
+    await call("get_expired_status_orders")
+    await call("update_order", order.id, phone="+70000000001")
+    await call("mark_order_paid", order.id)
+    await call("get_promo_stats")
+    await call("get_promo_stats", before_id=2)
+    await call("set_promo_active", "storage15", True)
+    await call("toggle_promo_active", "storage15")
+    await call("redeem_promo", "storage15", user_id)
+    await call("save_media_file_id", "data/bench.pdf", "0" * 64, "FILE_ID")
+    await call("get_media_file_id", "data/bench.pdf", "0" * 64)
+    await call("forget_media_file_id", "data/bench.pdf", "0" * 64)
+    await call("send_due_reminders")
+    await call("expire_overdue_orders")
+    await call("dispose_abandoned_orders")
+    await call("insert_promo_codes", {"ONCE2345AB"}, 10)
+    await call("get_valid_promo", "NO-SUCH-CODE")
+    await call("get_valid_promo", "once2345ab")  # одноразовый: точечный запрос по коду
+    await call("load_fsm_record", "fsm:1:1:1")
+    await call("purge_fsm_records", datetime.datetime.now())
+
+    failures = 0
+    for name, statement, details in plans:
+        # SCAN подзапроса (anon_1) проходит уже ограниченный результат, интересны только таблицы
+        scans = [d for d in details if (m := FULL_SCAN.match(d)) and m.group(1) in Base.metadata.tables]
+        bad = scans and name not in FULL_LISTINGS
+        failures += bool(bad)
+        mark = "FAIL" if bad else "ok  "
+        print(f"{mark} {name}: {statement}")
+        for detail in details:
+            print(f"       {detail}")
+
+    used = {}
+    for name, _, details in plans:
+        used.setdefault(name, set()).update(
+            m.group(1) for d in details if (m := INDEX_USED.search(d))
+        )
+    missing = 0
+    for name, indexes in REQUIRED_INDEXES.items():
+        if not indexes & used.get(name, set()):
+            missing += 1
+            print(f"FAIL {name}: не использует {' / '.join(sorted(indexes))}")
+
+    await engine.dispose()
+    print(f"\nЗапросов: {len(plans)}, с полным сканированием: {failures}, без обязательного индекса: {missing}")
+    return failures + missing
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
@@ -0,0 +1,74 @@
+"""Пропускная способность записи SQLite: профиль по умолчанию против продакшен-профиля
+
+Запуск: python -m benchmarks.sqlite_write [--writers 20] [--transactions 50] [--dir .]
+
+На tmpfs fsync бесплатен, поэтому каталог лучше указывать на реальном диске.
+"""
+import argparse
+import asyncio
+import datetime
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.models import Base, User, Order
+from database.session import make_engine, PRODUCTION_PRAGMAS
+
+
+async def writer(session_factory, user_id, transactions):
+    """Каждая транзакция — отдельный заказ, как при оформлении аренды"""
+    for _ in range(transactions):
+        async with session_factory() as session:
+            session.add(Order(
+                user_id=user_id,
+                fio="Бенчмарк",
+                phone="+70000000000",
+                email="bench@example.com",
+                volume="small",
+                delivery_type="Самовывоз",
+                estimated_price=1500,
+                status="CREATED",
+                start_date=datetime.date.today(),
+                end_date=datetime.date.today(),
+            ))
+            await session.commit()
+
+
+async def run_profile(name, pragmas, writers, transactions, directory):
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        engine = make_engine(str(Path(tmp) / "bench.sqlite3"), echo=False, pragmas=pragmas)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            users = [User(telegram_id=i) for i in range(writers)]
+            session.add_all(users)
+            await session.commit()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            writer(session_factory, user.id, transactions) for user in users
+        ))
+        elapsed = time.perf_counter() - started
+        await engine.dispose()
+
+    total = writers * transactions
+    print(f"{name:<12} {total} транзакций за {elapsed:.2f} с — {total / elapsed:.0f} tx/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=20)
+    parser.add_argument("--transactions", type=int, default=50)
+    parser.add_argument("--dir", default=".")
+    args = parser.parse_args()
+
+    await run_profile("default", None, args.writers, args.transactions, args.dir)
+    await run_profile("production", PRODUCTION_PRAGMAS, args.writers, args.transactions, args.dir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,283 @@
+"""Пропускная способность приёма апдейтов: long polling, он же с ChatSchedulerMiddleware и вебхук
+
+Всё локально: поддельный Bot API на aiohttp отдаёт апдейты через getUpdates или шлёт их
+POST-запросами в вебхук (как Telegram, по --connections keep-alive соединениям) и принимает sendMessage.
+Обработчик имитирует ввод-вывод случайной задержкой и отвечает в чат номером сообщения —
+по ответам считаются задержка и нарушения порядка внутри чата.
+
+Запуск: python -m benchmarks.webhook_vs_polling [--rate 1000] [--count 5000] [--chats 200]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+from middlewares.scheduler import ChatSchedulerMiddleware
+from services.webhook import UpdateQueue, build_app
+
+TOKEN = "42:BENCHMARK"
+WEBHOOK_PATH = "/webhook"
+
+
+class FakeBotApi:
+    """Минимальный Bot API: getMe, getUpdates, setWebhook/deleteWebhook и sendMessage"""
+
+    def __init__(self):
+        self.pending: list[dict] = []
+        self.arrived = asyncio.Event()
+        self.replies: list[tuple[float, int, int]] = []  # (время, чат, номер сообщения в чате)
+        self.done = asyncio.Event()
+        self.expected = 0
+        self._message_id = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await request.post()
+
+        if method == "getMe":
+            return self._ok({"id": 42, "is_bot": True, "first_name": "bench"})
+        if method in ("setWebhook", "deleteWebhook"):
+            return self._ok(True)
+        if method == "getUpdates":
+            return self._ok(await self._get_updates(int(params.get("offset", 0)), float(params.get("timeout", 0))))
+        if method == "sendMessage":
+            chat_id = int(params["chat_id"])
+            self.replies.append((time.perf_counter(), chat_id, int(params["text"])))
+            if len(self.replies) >= self.expected:
+                self.done.set()
+            self._message_id += 1
+            return self._ok({
+                "message_id": self._message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params["text"]
+            })
+        return web.json_response({"ok": False, "error_code": 404, "description": "Not Found"}, status=404)
+
+    async def _get_updates(self, offset: int, timeout: float) -> list[dict]:
+        self.pending = [update for update in self.pending if update["update_id"] >= offset]
+        if not self.pending:
+            self.arrived.clear()
+            try:
+                await asyncio.wait_for(self.arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.pending[:100]
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+
+def make_updates(count: int, chats: int) -> list[dict]:
+    rng = random.Random(42)
+    sequence = {}
+    updates = []
+    for update_id in range(1, count + 1):
+        chat_id = rng.randint(1, chats)
+        sequence[chat_id] = sequence.get(chat_id, 0) + 1
+        updates.append({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "U"},
+                "text": str(sequence[chat_id])
+            }
+        })
+    return updates
+
+
+def make_dispatcher(min_delay: float, max_delay: float, update_scheduler=None) -> Dispatcher:
+    router = Router()
+    rng = random.Random(7)
+
+    @router.message()
+    async def echo(message: Message):
+        # запросы к базе, SMTP и т.п. — разной длительности
+        await asyncio.sleep(rng.uniform(min_delay, max_delay))
+        await message.answer(message.text)
+
+    dp = Dispatcher()
+    if update_scheduler is not None:
+        dp.update.outer_middleware(update_scheduler)
+    dp.include_router(router)
+    return dp
+
+
+async def telegram_sender(host: str, port: int, outgoing: asyncio.Queue):
+    """Одно keep-alive соединение с вебхуком, как у Telegram; на 503 повторяет доставку.
+    HTTP написан вручную: клиент aiohttp съедал бы тот же процессор, что и измеряемый сервер"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            update = await outgoing.get()
+            body = json.dumps(update).encode()
+            request = (
+                f"POST {WEBHOOK_PATH} HTTP/1.1\r\nHost: {host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+            ).encode() + body
+            while True:
+                writer.write(request)
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while (line := await reader.readline()) != b"\r\n":
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                if status == 200:
+                    break
+                await asyncio.sleep(0.1)
+    finally:
+        writer.close()
+
+
+async def paced(updates: list[dict], rate: float, send):
+    """Отдаёт апдейты с заданной частотой; возвращает время отправки каждого"""
+    sent_at = {}
+    started = time.perf_counter()
+    for index, update in enumerate(updates):
+        delay = started + index / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent_at[update["update_id"]] = time.perf_counter()
+        await send(update)
+    return sent_at
+
+
+async def run(mode: str, args) -> dict:
+    api = FakeBotApi()
+    api_app = web.Application()
+    api_app.router.add_post("/bot{token}/{method}", api.handle)
+    api_runner = web.AppRunner(api_app)
+    await api_runner.setup()
+    await web.TCPSite(api_runner, "127.0.0.1", args.api_port).start()
+
+    updates = make_updates(args.count, args.chats)
+    api.expected = len(updates)
+    bot = Bot(
+        TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{args.api_port}"))
+    )
+    # вебхук полагается на планировщик так же, как бот в main.py
+    update_scheduler = ChatSchedulerMiddleware(args.concurrency) if mode != "polling" else None
+    dp = make_dispatcher(args.min_delay, args.max_delay, update_scheduler)
+    cleanup = []
+
+    if mode in ("polling", "scheduled"):
+        polling = asyncio.create_task(
+            dp.start_polling(bot, polling_timeout=1, handle_signals=False, close_bot_session=False)
+        )
+
+        async def send(update):
+            api.pending.append(update)
+            api.arrived.set()
+
+        async def stop():
+            await dp.stop_polling()
+            await polling
+        cleanup.append(stop)
+    else:
+        queue = UpdateQueue(dp, bot, queue_size=args.queue_size)
+        runner = web.AppRunner(build_app(bot, queue, WEBHOOK_PATH, secret=""))
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", args.webhook_port).start()
+        # Telegram держит не больше max_connections соединений с вебхуком
+        outgoing = asyncio.Queue()
+        senders = [
+            asyncio.create_task(telegram_sender("127.0.0.1", args.webhook_port, outgoing))
+            for _ in range(args.connections)
+        ]
+
+        async def send(update):
+            outgoing.put_nowait(update)
+
+        async def stop():
+            await queue.stop()
+            for sender in senders:
+                sender.cancel()
+            await runner.cleanup()
+        cleanup.append(stop)
+
+    await asyncio.sleep(0.2)
+    started = time.perf_counter()
+    sent_at = await paced(updates, args.rate, send)
+    try:
+        await asyncio.wait_for(api.done.wait(), args.count / args.rate * 10 + 30)
+    except asyncio.TimeoutError:
+        print(f"{mode}: обработано только {len(api.replies)} из {len(updates)}")
+    finished = time.perf_counter()
+
+    for stop in cleanup:
+        await stop()
+    await bot.session.close()
+    await api_runner.cleanup()
+
+    # задержка — от отдачи апдейта до ответа в чат; порядок — номера ответов в каждом чате
+    chat_updates = {}
+    for update in updates:
+        chat_updates.setdefault(update["message"]["chat"]["id"], []).append(update["update_id"])
+    latencies = []
+    last_seen = {}
+    out_of_order = 0
+    for at, chat_id, number in api.replies:
+        update_id = chat_updates[chat_id][number - 1]
+        latencies.append((at - sent_at[update_id]) * 1000)
+        if number < last_seen.get(chat_id, 0):
+            out_of_order += 1
+        last_seen[chat_id] = max(number, last_seen.get(chat_id, 0))
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "throughput": len(api.replies) / (finished - started),
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "out_of_order": out_of_order,
+        "scheduler": update_scheduler and update_scheduler.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=1000, help="апдейтов в секунду")
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--min-delay", type=float, default=0.005)
+    parser.add_argument("--max-delay", type=float, default=0.050)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--queue-size", type=int, default=4096)
+    parser.add_argument("--connections", type=int, default=40)
+    parser.add_argument("--api-port", type=int, default=18081)
+    parser.add_argument("--webhook-port", type=int, default=18082)
+    args = parser.parse_args()
+
+    print(
+        f"Апдейтов: {args.count} с частотой {args.rate:.0f}/с, чатов: {args.chats}, "
+        f"обработчик: {args.min_delay * 1000:.0f}–{args.max_delay * 1000:.0f} мс"
+    )
+    for mode in ("polling", "scheduled", "webhook"):
+        result = asyncio.run(run(mode, args))
+        print(
+            f"{result['mode']:>9}: {result['throughput']:.0f} апдейтов/с, "
+            f"задержка p50 {result['p50']:.0f} мс, p95 {result['p95']:.0f} мс, p99 {result['p99']:.0f} мс, "
+            f"не по порядку в чате: {result['out_of_order']}"
+        )
+        if result["scheduler"]:
+            stats = result["scheduler"]
+            print(
+                f"{'':>9}  ожидание очереди чата и слота: p50 {stats['wait_p50_ms']:.0f} мс, "
+                f"p95 {stats['wait_p95_ms']:.0f} мс, максимум {stats['wait_max_ms']:.0f} мс"
+            )
+
+
+if __name__ == "__main__":
+    main()
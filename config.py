@@ -1,29 +1,14 @@
-import json
 from pathlib import Path
 from decouple import config as env
 
 
 BASE_DIR = Path(__file__).resolve().parent
-DB_PATH = env("DB_PATH")
+DB_PATH = env("DB_PATH", default="db.sqlite3")
+DB_ECHO = env("DB_ECHO", default=False, cast=bool)
 
+# содержимое читает и перечитывает на лету services.settings
 CONFIG_PATH = BASE_DIR / "config.json"
 
-with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-    DB = json.load(f)
-
-
-PROHIBITED_KEYWORDS = DB["keywords"]["prohibited_keywords"]
-ALLOWED_KEYWORDS = DB["keywords"]["allowed_keywords"]
-
-PD_PDF_PATH = BASE_DIR/"data"/DB["meta"]["pd_agreement"]["pdf_file"]
-
-BOXES = DB["tariffs"]["boxes"]
-DELIVERY_SETTINGS = DB["tariffs"]["delivery"]
-MANAGER_PHONE = DB["meta"]["manager_phone"]
-MANAGER_TG_ID = DB["meta"]["manager_telegram_id"]
-WAREHOUSE_ADDRESS = DB["meta"]["warehouse_address"]
-PROMO_CODES = DB.get("promo_codes", [])
-
 
 ORDER_STATUSES = {
     "CREATED": "Создан",
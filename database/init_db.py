@@ -1,20 +1,25 @@
-import datetime
 from sqlalchemy import select
 from database.models import Base, PromoCode
 from database.session import engine, async_session
+from database.migrations import run_migrations
+from services import promo_index, settings
 
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    await run_migrations(engine)
+
+    await seed_promos(settings.current())
+
+
+async def seed_promos(config: settings.Settings):
+    """Заводит промокоды из config.json, которых ещё нет в базе; уже заведённые не трогает"""
     async with async_session() as session:
-        await _ensure_promo(session, "storage2022", 20,
-                            datetime.date(2026, 2, 1),
-                            datetime.date(2026, 3, 31))
-        await _ensure_promo(session, "storage15", 15,
-                            datetime.date(2025, 11, 1),
-                            datetime.date(2026, 4, 30))
+        for seed in config.promo_seeds:
+            await _ensure_promo(session, seed.code, seed.discount_percent,
+                                seed.active_from, seed.active_to)
         await session.commit()
 
 async def _ensure_promo(session, code, percent, active_from, active_to):
@@ -27,4 +32,5 @@ async def _ensure_promo(session, code, percent, active_from, active_to):
             active_from=active_from,
             active_to=active_to,
             is_active=True
-        ))
\ No newline at end of file
+        ))
+        promo_index.mark_changed(session)
@@ -0,0 +1,131 @@
+import datetime
+from sqlalchemy import text
+
+
+# Защитные помощники: миграция должна спокойно переживать повторный запуск
+# и базу, которую create_all уже довёл до нужной схемы
+
+def _has_column(conn, table: str, column: str) -> bool:
+    rows = conn.execute(text(f"PRAGMA table_info({table})")).all()
+    return any(row[1] == column for row in rows)
+
+
+def _add_column(conn, table: str, column: str, ddl: str):
+    if not _has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_index(conn, name: str, table: str, *columns: str, unique: bool = False):
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    conn.execute(text(
+        f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    ))
+
+
+def _0001_order_indexes(conn):
+    """Индексы под выборки заказов из repository.py"""
+    _create_index(conn, "ix_orders_user_id", "orders", "user_id")
+    _create_index(conn, "ix_orders_status_end_date", "orders", "status", "end_date")
+    _create_index(conn, "ix_orders_promo_code", "orders", "promo_code")
+    _create_index(
+        conn, "ix_orders_delivery_queue", "orders",
+        "is_delivery_required", "is_delivered", "status", "id"
+    )
+    _create_index(
+        conn, "ix_email_outbox_status_next_attempt", "email_outbox",
+        "status", "next_attempt_at"
+    )
+
+
+def _0002_admin_orders_index(conn):
+    """Индекс для постраничного списка заказов в админке"""
+    _create_index(conn, "ix_orders_status_id", "orders", "status", "id")
+
+
+def _0003_promo_limits(conn):
+    """Лимиты использования промокодов"""
+    _add_column(conn, "promo_codes", "max_uses", "INTEGER")
+    _add_column(conn, "promo_codes", "per_user_limit", "INTEGER")
+
+
+def _0004_notification_log_end_date(conn):
+    """Журнал напоминаний различает даты окончания: продлённый заказ снова получает напоминания"""
+    if _has_column(conn, "notification_log", "end_date"):
+        return
+    # уникальное ограничение в SQLite не поменять через ALTER — пересобираем таблицу;
+    # старым записям достаётся текущая дата окончания заказа, чтобы письма не ушли повторно
+    conn.execute(text(
+        "CREATE TABLE notification_log_new ("
+        "id INTEGER NOT NULL PRIMARY KEY, "
+        "order_id INTEGER NOT NULL REFERENCES orders (id), "
+        "kind VARCHAR(30) NOT NULL, "
+        "end_date DATE, "
+        "created_at DATETIME NOT NULL, "
+        "CONSTRAINT uq_notification_log_order_kind_end UNIQUE (order_id, kind, end_date))"
+    ))
+    conn.execute(text(
+        "INSERT INTO notification_log_new (id, order_id, kind, end_date, created_at) "
+        "SELECT log.id, log.order_id, log.kind, orders.end_date, log.created_at "
+        "FROM notification_log AS log LEFT JOIN orders ON orders.id = log.order_id"
+    ))
+    conn.execute(text("DROP TABLE notification_log"))
+    conn.execute(text("ALTER TABLE notification_log_new RENAME TO notification_log"))
+
+
+def _0005_promo_max_uses_index(conn):
+    """Индекс для загрузки многоразовых промокодов без прохода по массовым выпускам"""
+    _create_index(conn, "ix_promo_codes_max_uses", "promo_codes", "max_uses")
+
+
+# (версия, описание, функция) — только добавлять в конец, не переписывать
+MIGRATIONS = [
+    (1, "индексы заказов", _0001_order_indexes),
+    (2, "индекс списка заказов админки", _0002_admin_orders_index),
+    (3, "лимиты промокодов", _0003_promo_limits),
+    (4, "дата окончания в журнале напоминаний", _0004_notification_log_end_date),
+    (5, "индекс лимита промокодов", _0005_promo_max_uses_index),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(255) NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+
+
+def current_version(conn) -> int:
+    _ensure_version_table(conn)
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def apply_migrations(conn) -> list[int]:
+    """Применяет недостающие миграции, каждую в своей транзакции"""
+    applied = []
+    version = current_version(conn)
+    conn.commit()
+
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+
+        migrate(conn)
+        conn.execute(
+            text(
+                "INSERT INTO schema_version (version, description, applied_at) "
+                "VALUES (:version, :description, :applied_at)"
+            ),
+            {"version": number, "description": description, "applied_at": datetime.datetime.now()}
+        )
+        conn.commit()
+        applied.append(number)
+        print(f"Применена миграция {number}: {description}")
+
+    return applied
+
+
+async def run_migrations(engine) -> list[int]:
+    async with engine.connect() as conn:
+        return await conn.run_sync(apply_migrations)
@@ -1,6 +1,6 @@
 import datetime
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, Date, DateTime, ForeignKey
+from sqlalchemy import String, Integer, Text, Date, DateTime, ForeignKey, Index, UniqueConstraint
 
 
 class Base(DeclarativeBase):
@@ -17,6 +17,13 @@ class User(Base):  # пользователи
 
 class Order(Base):  # заказы
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_user_id", "user_id"),
+        Index("ix_orders_status_end_date", "status", "end_date"),
+        Index("ix_orders_status_id", "status", "id"),
+        Index("ix_orders_promo_code", "promo_code"),
+        Index("ix_orders_delivery_queue", "is_delivery_required", "is_delivered", "status", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)  # ID заказа
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))  # связь пользователя с заказом
@@ -46,6 +53,9 @@ class Order(Base):  # заказы
 
 class PromoCode(Base):  # промокоды
     __tablename__ = "promo_codes"
+    __table_args__ = (
+        Index("ix_promo_codes_max_uses", "max_uses"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)  # ID промокода
     code: Mapped[str] = mapped_column(String(50), unique=True)  # промокод
@@ -55,3 +65,61 @@ class PromoCode(Base):  # промокоды
     is_active: Mapped[bool] = mapped_column(default=True)  # активность промокода
     is_advertising: Mapped[bool] = mapped_column(default=False) # реклама
     usage_count: Mapped[int] = mapped_column(default=0) # количество использований
+    max_uses: Mapped[int] = mapped_column(Integer, nullable=True)  # общий лимит использований, None — без лимита
+    per_user_limit: Mapped[int] = mapped_column(Integer, nullable=True)  # лимит на одного пользователя, None — без лимита
+
+
+class OutboxEmail(Base):  # очередь исходящих писем
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)  # ID письма
+    email: Mapped[str] = mapped_column(String(255))  # адрес получателя
+    subject: Mapped[str] = mapped_column(String(255))  # тема письма
+    body: Mapped[str] = mapped_column(Text)  # текст письма
+    status: Mapped[str] = mapped_column(String(20), default="PENDING")  # PENDING / SENT / DEAD
+    attempts: Mapped[int] = mapped_column(default=0)  # количество попыток отправки
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now)  # время следующей попытки
+    last_error: Mapped[str] = mapped_column(String(500), nullable=True)  # последняя ошибка отправки
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now)  # дата постановки в очередь
+    sent_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)  # дата отправки
+
+
+class NotificationLog(Base):  # журнал отправленных напоминаний
+    __tablename__ = "notification_log"
+    __table_args__ = (
+        UniqueConstraint("order_id", "kind", "end_date", name="uq_notification_log_order_kind_end"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)  # ID записи
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"))  # заказ
+    kind: Mapped[str] = mapped_column(String(30))  # вид напоминания: expiring_7, overdue_30
+    end_date: Mapped[datetime.date] = mapped_column(Date, nullable=True)  # дата окончания, к которой относилось напоминание
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now)  # дата постановки письма в очередь
+
+
+class MediaFile(Base):  # файлы, уже загруженные в Telegram
+    __tablename__ = "media_files"
+    __table_args__ = (
+        UniqueConstraint("path", "content_hash", name="uq_media_files_path_hash"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)  # ID записи
+    path: Mapped[str] = mapped_column(String(255))  # путь к файлу относительно корня проекта
+    content_hash: Mapped[str] = mapped_column(String(64))  # sha256 содержимого
+    file_id: Mapped[str] = mapped_column(String(255))  # file_id, который вернул Telegram
+    uploaded_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now)  # дата загрузки
+
+
+class FsmRecord(Base):  # незавершённые диалоги (состояния FSM aiogram)
+    __tablename__ = "fsm_states"
+    __table_args__ = (
+        Index("ix_fsm_states_updated_at", "updated_at"),
+    )
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)  # ключ aiogram: бот, чат, пользователь
+    state: Mapped[str] = mapped_column(String(100), nullable=True)  # текущее состояние диалога
+    data: Mapped[str] = mapped_column(Text, default="{}")  # данные диалога в JSON
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime)  # последнее изменение, по нему удаляются брошенные диалоги
@@ -1,31 +1,64 @@
 import datetime
-import smtplib
-import ssl
-import json
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from sqlalchemy import select, update, and_
-from database.session import async_session
-from database.models import User, Order, PromoCode
-from sqlalchemy import func
+from collections import OrderedDict
 from decouple import config
+from sqlalchemy import select, insert, update, delete, and_, or_, case, event, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database.session import async_session, session_scope
+from database.models import User, Order, PromoCode, OutboxEmail, NotificationLog, MediaFile, FsmRecord
+from sqlalchemy import func
+from services import promo_index, settings
 
+USER_CACHE_SIZE = config('USER_CACHE_SIZE', default=10000, cast=int)
 
-async def get_or_create_user(telegram_id: int):
-    async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+# telegram_id -> users.id, вытесняются давно не заходившие
+_user_ids: OrderedDict[int, int] = OrderedDict()
+
+
+def _remember_user(telegram_id: int, user_id: int):
+    _user_ids[telegram_id] = user_id
+    _user_ids.move_to_end(telegram_id)
+    if len(_user_ids) > USER_CACHE_SIZE:
+        _user_ids.popitem(last=False)
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_users(session):
+    # нового пользователя кэшируем только после коммита, иначе откат оставит в кэше несуществующий id
+    for telegram_id, user_id in session.info.pop("new_user_ids", {}).items():
+        _remember_user(telegram_id, user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_uncommitted_users(session):
+    session.info.pop("new_user_ids", None)
+
+
+async def get_or_create_user(telegram_id: int, session: AsyncSession | None = None) -> tuple[int, bool]:
+    """Возвращает (id пользователя, создан ли он сейчас)"""
+    user_id = _user_ids.get(telegram_id)
+    if user_id is not None:
+        _user_ids.move_to_end(telegram_id)
+        return user_id, False
+
+    async with session_scope(session) as session:
+        user_id = await session.scalar(
+            sqlite_insert(User)
+            .values(telegram_id=telegram_id)
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            .returning(User.id)
         )
-        user = result.scalar_one_or_none()
 
-        if user:
-            return user, False
+        if user_id is not None:
+            session.info.setdefault("new_user_ids", {})[telegram_id] = user_id
+            return user_id, True
 
-        user = User(telegram_id=telegram_id)
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-        return user, True
+        user_id = await session.scalar(
+            select(User.id).where(User.telegram_id == telegram_id)
+        )
+        _remember_user(telegram_id, user_id)
+        return user_id, False
 
 
 async def create_order(
@@ -40,9 +73,10 @@ async def create_order(
     end_date: str | None = None,
     promo_code: str | None = None,
     email: str | None = None,
-    is_delivery_required: bool = False
+    is_delivery_required: bool = False,
+    session: AsyncSession | None = None
 ):
-    async with async_session() as session:
+    async with session_scope(session) as session:
         order = Order(
             user_id=user_id,
             fio=fio,
@@ -59,51 +93,36 @@ async def create_order(
             is_delivery_required=is_delivery_required
         )
         session.add(order)
-        await session.commit()
-        await session.refresh(order)
+        await session.flush()
         return order
 
 
-async def get_order_by_id(order_id: int):
-    async with async_session() as session:
+async def get_order_by_id(order_id: int, session: AsyncSession | None = None):
+    async with session_scope(session) as session:
         result = await session.execute(
             select(Order).where(Order.id == order_id)
         )
         return result.scalar_one_or_none()
 
 
-async def get_user_orders(user_id: int):
-    async with async_session() as session:
+async def get_user_orders(user_id: int, session: AsyncSession | None = None):
+    async with session_scope(session) as session:
         result = await session.execute(
             select(Order).where(Order.user_id == user_id)
         )
         return result.scalars().all()
 
 
-async def get_valid_promo(code: str):
-    today = datetime.date.today()
-    async with async_session() as session:
-        result = await session.execute(
-            select(PromoCode).where(
-                PromoCode.code == code,
-                PromoCode.is_active == True,
-                (PromoCode.active_from == None) | (PromoCode.active_from <= today),
-                (PromoCode.active_to == None) | (PromoCode.active_to >= today),
-            )
-        )
-        return result.scalar_one_or_none()
-
-
-async def get_all_orders():
-    async with async_session() as session:
+async def get_all_orders(session: AsyncSession | None = None):
+    async with session_scope(session) as session:
         result = await session.execute(
             select(Order).order_by(Order.id.desc())
         )
         return result.scalars().all()
 
 
-async def get_orders_for_delivery():
-    async with async_session() as session:
+async def get_orders_for_delivery(session: AsyncSession | None = None):
+    async with session_scope(session) as session:
         result = await session.execute(
             select(Order).where(
                 and_(
@@ -116,19 +135,48 @@ async def get_orders_for_delivery():
         return result.scalars().all()
 
 
-async def get_orders_for_admin_list():
-    async with async_session() as session:
+ADMIN_LIST_STATUSES = ["CREATED", "PAID"]
+
+
+async def get_orders_page(
+    before_id: int | None = None,
+    after_id: int | None = None,
+    limit: int = 10,
+    session: AsyncSession | None = None
+) -> tuple[list[Order], bool]:
+    """Страница открытых заказов по ключу id (новые сверху) и признак, что дальше по ходу есть ещё"""
+    ascending = after_id is not None
+    order_by = Order.id.asc() if ascending else Order.id.desc()
+
+    # по статусу отдельно: каждая ветка идёт по индексу (status, id) и читает не больше limit + 1 строк
+    branches = []
+    for status in ADMIN_LIST_STATUSES:
+        branch = select(Order.id).where(Order.status == status)
+        if ascending:
+            branch = branch.where(Order.id > after_id)
+        elif before_id is not None:
+            branch = branch.where(Order.id < before_id)
+        branches.append(select(branch.order_by(order_by).limit(limit + 1).subquery()))
+
+    async with session_scope(session) as session:
         result = await session.execute(
-            select(Order).where(
-                Order.status.in_(["CREATED", "PAID"])
-            ).order_by(Order.id.desc())
+            select(Order)
+            .where(Order.id.in_(union_all(*branches)))
+            .order_by(order_by)
+            .limit(limit + 1)
         )
-        return result.scalars().all()
+        orders = list(result.scalars().all())
+
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    if ascending:
+        orders.reverse()
+    return orders, has_more
 
 
-async def get_orders_in_storage():
+async def get_orders_in_storage(session: AsyncSession | None = None):
     today = datetime.date.today()
-    async with async_session() as session:
+    async with session_scope(session) as session:
         result = await session.execute(
             select(Order).where(
                 and_(
@@ -141,9 +189,9 @@ async def get_orders_in_storage():
         return result.scalars().all()
 
 
-async def get_expired_orders():
+async def get_expired_orders(session: AsyncSession | None = None):
     today = datetime.date.today()
-    async with async_session() as session:
+    async with session_scope(session) as session:
         result = await session.execute(
             select(Order).where(
                 and_(
@@ -155,226 +203,376 @@ async def get_expired_orders():
         return result.scalars().all()
 
 
-async def update_order(order_id: int, **kwargs):
-    async with async_session() as session:
+async def update_order(order_id: int, session: AsyncSession | None = None, **kwargs):
+    async with session_scope(session) as session:
         await session.execute(
             update(Order).where(Order.id == order_id).values(**kwargs)
         )
-        await session.commit()
-
-
-async def mark_order_paid(order_id: int):
-    await update_order(order_id, status="PAID", start_date=datetime.date.today())
-
-
-async def mark_order_in_storage(order_id: int):
-    await update_order(order_id, status="IN_STORAGE")
 
 
-async def mark_order_delivered(order_id: int):
-    await update_order(order_id, is_delivered=True)
+async def mark_order_paid(order_id: int, session: AsyncSession | None = None):
+    async with session_scope(session) as session:
+        order = await session.get(Order, order_id)
+        if not order:
+            return None
 
+        order.status = "PAID"
+        order.start_date = datetime.date.today()
+        enqueue_email(session, order.email, *payment_letter(order))
+        return order
 
-async def mark_order_expired(order_id: int):
-    await update_order(order_id, status="EXPIRED")
 
+async def mark_order_in_storage(order_id: int, session: AsyncSession | None = None):
+    await update_order(order_id, session, status="IN_STORAGE")
 
-async def admin_check_expired_orders() -> int:
-    today = datetime.date.today()
-    expired_orders = await get_expired_orders()
 
-    processed = 0
-    for order in expired_orders:
-        if not order.end_date:
-            continue
+async def mark_order_delivered(order_id: int, session: AsyncSession | None = None):
+    await update_order(order_id, session, is_delivered=True)
 
-        if order.end_date < today:
-            await mark_order_expired(order.id)
-            await notify_order_expired(order.id)
-            processed += 1
 
-    return processed
+async def mark_order_expired(order_id: int, session: AsyncSession | None = None):
+    await update_order(order_id, session, status="EXPIRED")
 
 
-async def get_expired_status_orders():
-    async with async_session() as session:
+async def get_expired_status_orders(session: AsyncSession | None = None):
+    async with session_scope(session) as session:
         result = await session.execute(
             select(Order).where(Order.status == "EXPIRED")
         )
         return result.scalars().all()
 
 
-async def create_promo(code: str, discount_percent: int, active_from=None, active_to=None):
-    async with async_session() as session:
+async def create_promo(
+    code: str,
+    discount_percent: int,
+    active_from=None,
+    active_to=None,
+    max_uses: int | None = None,
+    per_user_limit: int | None = None,
+    session: AsyncSession | None = None
+):
+    async with session_scope(session) as session:
         promo = PromoCode(
             code=code,
             discount_percent=discount_percent,
             is_active=True,
             active_from=active_from,
-            active_to=active_to
+            active_to=active_to,
+            max_uses=max_uses,
+            per_user_limit=per_user_limit
         )
         session.add(promo)
-        await session.commit()
-
-
-async def get_all_promo():
-    async with async_session() as session:
-        result = await session.execute(select(PromoCode).order_by(PromoCode.id.desc()))
-        return result.scalars().all()
+        promo_index.mark_changed(session)
+
+
+async def insert_promo_codes(
+    codes: list[str],
+    discount_percent: int,
+    active_to=None,
+    max_uses: int | None = 1,
+    session: AsyncSession | None = None
+) -> list[str]:
+    """Вставляет пачку одноразовых кодов одним executemany, возвращает реально вставленные.
+
+    Индекс промокодов не сбрасывается: одноразовых кодов в нём нет, а выпуск из многих
+    пачек сбрасывает его один раз в конце (services.promo_batch).
+    """
+    async with session_scope(session) as session:
+        result = await session.execute(
+            sqlite_insert(PromoCode)
+            .on_conflict_do_nothing(index_elements=[PromoCode.code])
+            .returning(PromoCode.code),
+            [
+                {
+                    "code": code,
+                    "discount_percent": discount_percent,
+                    "active_to": active_to,
+                    "max_uses": max_uses,
+                    "per_user_limit": 1,
+                }
+                for code in codes
+            ]
+        )
+        return list(result.scalars())
 
 
-async def set_promo_active(code: str, active: bool):
-    async with async_session() as session:
+async def set_promo_active(code: str, active: bool, session: AsyncSession | None = None):
+    async with session_scope(session) as session:
         await session.execute(
             update(PromoCode).where(PromoCode.code == code).values(is_active=active)
         )
-        await session.commit()
+        promo_index.mark_changed(session)
+
+
+async def toggle_promo_active(code: str, session: AsyncSession | None = None) -> bool | None:
+    """Переключает активность промокода, возвращает новое значение или None, если кода нет"""
+    async with session_scope(session) as session:
+        promo_index.mark_changed(session)
+        return await session.scalar(
+            update(PromoCode)
+            .where(PromoCode.code == code)
+            .values(is_active=~PromoCode.is_active)
+            .returning(PromoCode.is_active)
+        )
 
 
-async def count_orders_by_promo(code: str) -> int:
-    async with async_session() as session:
+# статусы, при которых заказ уже оплачен
+PAID_STATUSES = ["PAID", "IN_STORAGE", "EXPIRED", "DISPOSED", "COMPLETED"]
+
+
+async def get_promo_stats(
+    before_id: int | None = None,
+    after_id: int | None = None,
+    limit: int = 10,
+    session: AsyncSession | None = None
+) -> tuple[list, bool]:
+    """Страница промокодов с числом заказов, выручкой и датой последнего использования.
+
+    Одноразовые коды массовых выпусков (max_uses = 1) не показываются: после одного
+    выпуска на сотни тысяч кодов до заведённых вручную было бы не долистать.
+    """
+    ascending = after_id is not None
+    revenue = func.coalesce(func.sum(case(
+        (Order.status.in_(PAID_STATUSES), func.coalesce(Order.final_price, Order.estimated_price)),
+        else_=0
+    )), 0)
+
+    # сначала ids страницы, потом агрегаты только по ним. Сортировка по id + 0, а не по id:
+    # иначе SQLite идёт по первичному ключу и перебирает все одноразовые коды подряд,
+    # вместо того чтобы взять немногие остальные по ix_promo_codes_max_uses
+    page = select(PromoCode.id).where(or_(PromoCode.max_uses == None, PromoCode.max_uses > 1))
+    if ascending:
+        page = page.where(PromoCode.id > after_id).order_by((PromoCode.id + 0).asc())
+    else:
+        if before_id is not None:
+            page = page.where(PromoCode.id < before_id)
+        page = page.order_by((PromoCode.id + 0).desc())
+    page = page.limit(limit + 1).subquery()
+
+    query = (
+        select(
+            PromoCode,
+            func.count(Order.id).label("orders_count"),
+            revenue.label("revenue"),
+            func.max(Order.start_date).label("last_used")
+        )
+        .join(page, page.c.id == PromoCode.id)
+        .outerjoin(Order, Order.promo_code == PromoCode.code)
+        .group_by(PromoCode.id)
+        .order_by(PromoCode.id.asc() if ascending else PromoCode.id.desc())
+    )
+
+    async with session_scope(session) as session:
+        result = await session.execute(query)
+        rows = list(result.all())
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if ascending:
+        rows.reverse()
+    return rows, has_more
+
+
+async def redeem_promo(code: str, user_id: int, session: AsyncSession | None = None) -> int | None:
+    """Списывает одно использование промокода, если он ещё действует и лимиты не исчерпаны.
+
+    Проверка и списание — один UPDATE, поэтому параллельные заказы не превысят max_uses.
+    Вызывать до create_order в той же транзакции. Возвращает процент скидки или None.
+    """
+    today = datetime.date.today()
+    used_by_user = (
+        select(func.count(Order.id))
+        .where(Order.promo_code == PromoCode.code, Order.user_id == user_id)
+        .scalar_subquery()
+    )
+
+    async with session_scope(session) as session:
         result = await session.execute(
-            select(func.count(Order.id)).where(Order.promo_code == code)
+            update(PromoCode)
+            .where(
+                PromoCode.code == code,
+                PromoCode.is_active == True,
+                or_(PromoCode.active_from == None, PromoCode.active_from <= today),
+                or_(PromoCode.active_to == None, PromoCode.active_to >= today),
+                or_(PromoCode.max_uses == None, PromoCode.usage_count < PromoCode.max_uses),
+                or_(PromoCode.per_user_limit == None, used_by_user < PromoCode.per_user_limit),
+            )
+            .values(usage_count=PromoCode.usage_count + 1)
+            .returning(PromoCode.discount_percent, PromoCode.usage_count, PromoCode.max_uses)
+        )
+        redeemed = result.first()
+        if redeemed is None:
+            return None
+        if redeemed.max_uses is not None and 1 < redeemed.max_uses <= redeemed.usage_count:
+            # последнее использование многоразового кода: он должен пропасть из индекса промокодов.
+            # Одноразовый ради этого не перечитываем — его хэш просто ведёт к точечному запросу,
+            # который исчерпанный код уже не найдёт
+            promo_index.mark_changed(session)
+        return redeemed.discount_percent
+
+
+async def get_media_file_id(path: str, content_hash: str, session: AsyncSession | None = None) -> str | None:
+    async with session_scope(session) as session:
+        return await session.scalar(
+            select(MediaFile.file_id).where(
+                MediaFile.path == path,
+                MediaFile.content_hash == content_hash
+            )
         )
-        return result.scalar_one()
 
 
-async def increase_promo_usage(code: str):
-    async with async_session() as session:
+async def save_media_file_id(path: str, content_hash: str, file_id: str, session: AsyncSession | None = None):
+    async with session_scope(session) as session:
         await session.execute(
-            update(PromoCode).where(PromoCode.code == code).values(usage_count=PromoCode.usage_count + 1)
+            sqlite_insert(MediaFile)
+            .values(path=path, content_hash=content_hash, file_id=file_id, uploaded_at=datetime.datetime.now())
+            .on_conflict_do_update(
+                index_elements=[MediaFile.path, MediaFile.content_hash],
+                set_={"file_id": file_id, "uploaded_at": datetime.datetime.now()}
+            )
         )
-        await session.commit()
 
 
-async def send_real_email(email: str, subject: str, message: str):
-    if not email:
-        print("Email не указан")
-        return False
+async def forget_media_file_id(path: str, content_hash: str, session: AsyncSession | None = None):
+    async with session_scope(session) as session:
+        await session.execute(
+            delete(MediaFile).where(
+                MediaFile.path == path,
+                MediaFile.content_hash == content_hash
+            )
+        )
 
-    sender_email = config('EMAIL', default='')
-    app_password = config('APP_PASSWORD', default='')
 
-    if not sender_email or not app_password:
-        print("EMAIL или APP_PASSWORD не настроены!")
-        return False
+async def load_fsm_record(key: str, session: AsyncSession | None = None):
+    """(state, data, updated_at) диалога или None"""
+    async with session_scope(session) as session:
+        result = await session.execute(
+            select(FsmRecord.state, FsmRecord.data, FsmRecord.updated_at).where(FsmRecord.key == key)
+        )
+        return result.first()
 
-    try:
-        letter = f"""From: {sender_email}
-To: {email}
-Subject: {subject}
-Content-Type: text/plain; charset="UTF-8";
 
-{message}"""
+async def save_fsm_records(records: list[dict], deleted_keys: list[str], session: AsyncSession | None = None):
+    """Записывает пачку изменённых диалогов одной транзакцией; завершённые удаляет"""
+    async with session_scope(session) as session:
+        if records:
+            statement = sqlite_insert(FsmRecord)
+            await session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[FsmRecord.key],
+                    set_={
+                        "state": statement.excluded.state,
+                        "data": statement.excluded.data,
+                        "updated_at": statement.excluded.updated_at
+                    }
+                ),
+                records
+            )
+        if deleted_keys:
+            await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(deleted_keys)))
 
-        letter = letter.encode("UTF-8")
 
-        print(f"📧 Отправка письма на: {email}")
+async def purge_fsm_records(updated_before: datetime.datetime, session: AsyncSession | None = None) -> int:
+    async with session_scope(session) as session:
+        result = await session.execute(delete(FsmRecord).where(FsmRecord.updated_at < updated_before))
+        return result.rowcount
 
-        context = ssl.create_default_context()
 
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465, context=context, timeout=30) as server:
-            server.login(sender_email, app_password)
-            server.sendmail(sender_email, email, letter)
+def enqueue_email(session, email: str, subject: str, message: str) -> bool:
+    """Кладёт письмо в outbox в транзакции вызывающего кода"""
+    if not email:
+        return False
 
-        print(f"EMAIL успешно отправлен: {email}")
-        return True
+    session.add(OutboxEmail(email=email, subject=subject, body=message))
+    return True
 
-    except Exception as e:
-        print(f"Ошибка отправки: {e}")
-        return False
 
+async def queue_email(email: str, subject: str, message: str, session: AsyncSession | None = None) -> bool:
+    async with session_scope(session) as session:
+        return enqueue_email(session, email, subject, message)
 
-async def notify_order_expiring_soon(order_id: int, days_left: int):
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject=f"Срок хранения истекает через {days_left} дней - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
 
-Напоминаем, что срок хранения вашего заказа №{order_id} истекает через {days_left} дней.
+def payment_letter(order: Order):
+    return "Оплата заказа принята - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
+
+Ваш заказ №{order.id} успешно оплачен!
 
 Детали заказа:
 Бокс: {order.volume}
-Дата окончания: {order.end_date}
-Телефон: {order.phone}
+Период аренды: с {order.start_date} по {order.end_date}
+Сумма: {order.estimated_price} ₽
+Способ доставки: {order.delivery_type}
 
-Если вы хотите продлить аренду или забрать вещи, свяжитесь с нами:
-Телефон: +7-918-714-58-30
-Telegram: @selfstorage_bot
+Статус:
+{'Доставка запланирована' if order.is_delivery_required else 'Ждем вас на складе'}
 
-С уважением,
-Команда SelfStorage"""
-        )
+Если вы заказали доставку, наш менеджер свяжется с вами в ближайшее время для уточнения деталей.
+Спасибо за выбор SelfStorage!
+"""
+
+
+def _days(count: int) -> str:
+    if count % 10 == 1 and count % 100 != 11:
+        return f"{count} день"
+    if 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        return f"{count} дня"
+    return f"{count} дней"
 
 
-async def notify_order_expired(order_id: int):
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject="Срок хранения истёк - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
+def _in_days(count: int) -> str:
+    if count == 0:
+        return "сегодня"
+    if count == 1:
+        return "завтра"
+    return f"через {_days(count)}"
 
-Срок хранения вашего заказа №{order_id} истёк.
+
+def expiring_soon_letter(order: Order, days_left: int):
+    return f"Срок хранения истекает {_in_days(days_left)} - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
+
+Напоминаем, что срок хранения вашего заказа №{order.id} истекает {_in_days(days_left)}.
 
 Детали заказа:
 Бокс: {order.volume}
 Дата окончания: {order.end_date}
 Телефон: {order.phone}
 
-Пожалуйста, свяжитесь с нами для продления аренды или вывоза вещей:
+Если вы хотите продлить аренду или забрать вещи, свяжитесь с нами:
 Телефон: +7-918-714-58-30
 Telegram: @selfstorage_bot
 
 С уважением,
 Команда SelfStorage"""
-        )
 
 
-async def notify_order_delivered(order_id: int):
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject="Ваш заказ принят на склад - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
+def expired_letter(order: Order):
+    return "Срок хранения истёк - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
 
-Ваш заказ №{order_id} успешно доставлен и принят на склад!
+Срок хранения вашего заказа №{order.id} истёк.
 
 Детали заказа:
 Бокс: {order.volume}
-Дата начала: {order.start_date}
 Дата окончания: {order.end_date}
-Сумма: {order.estimated_price} ₽
-
-Ваши вещи находятся на складе по адресу:
-г. Москва, ул. Складская, д. 15
+Телефон: {order.phone}
 
-В случае вопросов свяжитесь с нами:
+Пожалуйста, свяжитесь с нами для продления аренды или вывоза вещей:
 Телефон: +7-918-714-58-30
 Telegram: @selfstorage_bot
 
 С уважением,
 Команда SelfStorage"""
-        )
 
-async def notify_order_overdue_30_days(order_id: int):
+
+def overdue_30_days_letter(order: Order):
     """Уведомление через 30 дней после просрочки"""
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject=f"Вещи просрочены уже 30 дней! - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
+    return "Вещи просрочены уже 30 дней! - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
 
 Ваши вещи находятся на складе уже 30 дней после окончания срока аренды.
 
 ВАЖНО: Согласно договору, вещи хранятся еще 6 месяцев по повышенному тарифу.
 После этого они будут утилизированы.
 
-Заказ №{order_id}
+Заказ №{order.id}
 Бокс: {order.volume}
 Дата окончания аренды: {order.end_date}
 
@@ -384,23 +582,17 @@ Telegram: @selfstorage_bot
 
 С уважением,
 Команда SelfStorage"""
-        )
 
 
-async def notify_order_overdue_60_days(order_id: int):
+def overdue_60_days_letter(order: Order):
     """Уведомление через 60 дней после просрочки"""
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject=f"Осталось 5 месяцев! - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
+    return "Осталось 5 месяцев! - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
 
 Напоминаем, что ваши вещи просрочены уже 60 дней.
 
 Осталось 5 месяцев до утилизации вещей.
 
-Заказ №{order_id}
+Заказ №{order.id}
 Бокс: {order.volume}
 
 Срочно свяжитесь с нами!
@@ -408,23 +600,17 @@ async def notify_order_overdue_60_days(order_id: int):
 
 С уважением,
 Команда SelfStorage"""
-        )
 
 
-async def notify_order_overdue_90_days(order_id: int):
+def overdue_90_days_letter(order: Order):
     """Уведомление через 90 дней после просрочки"""
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject=f"Осталось 3 месяца! - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
+    return "Осталось 3 месяца! - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
 
 Ваши вещи просрочены уже 90 дней!
 
 ВНИМАНИЕ: Осталось 3 месяца до утилизации!
 
-Заказ №{order_id}
+Заказ №{order.id}
 Бокс: {order.volume}
 
 Не допустите потери вещей - свяжитесь с нами!
@@ -432,61 +618,43 @@ async def notify_order_overdue_90_days(order_id: int):
 
 С уважением,
 Команда SelfStorage"""
-        )
 
 
-async def notify_order_overdue_120_days(order_id: int):
+def overdue_120_days_letter(order: Order):
     """Уведомление через 120 дней после просрочки"""
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject=f"Осталось 2 месяца! - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
+    return "Осталось 2 месяца! - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
 
 Ваши вещи просрочены уже 4 месяца!
 
 Осталось 2 месяца до утилизации!
 
-Заказ №{order_id}
+Заказ №{order.id}
 
 Срочно свяжитесь с нами!
 Телефон: +7-918-714-58-30
 
 С уважением,
 Команда SelfStorage"""
-        )
 
 
-async def notify_order_overdue_150_days(order_id: int):
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject=f"Остался 1 месяц! - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
+def overdue_150_days_letter(order: Order):
+    return "Остался 1 месяц! - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
 
 ОСТАЛСЯ 1 МЕСЯЦ!
 
 Ваши вещи будут утилизированы через 30 дней!
 
-Заказ №{order_id}
+Заказ №{order.id}
 
 Срочно свяжитесь с нами!
 Телефон: +7-918-714-58-30
 
 С уважением,
 Команда SelfStorage"""
-        )
 
 
-async def notify_order_about_to_be_disposed(order_id: int):
-    order = await get_order_by_id(order_id)
-    if order and order.email:
-        await send_real_email(
-            email=order.email,
-            subject=f"УТИЛИЗАЦИЯ ВЕЩЕЙ! - SelfStorage",
-            message=f"""Уважаемый {order.fio or 'клиент'}!
+def disposal_letter(order: Order):
+    return "УТИЛИЗАЦИЯ ВЕЩЕЙ! - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
 
 ВНИМАНИЕ!
 
@@ -494,7 +662,7 @@ async def notify_order_about_to_be_disposed(order_id: int):
 
 К сожалению, мы вынуждены утилизировать ваши вещи.
 
-Заказ №{order_id}
+Заказ №{order.id}
 Бокс: {order.volume}
 
 Если это сообщение застало вас врасплох, срочно свяжитесь с нами:
@@ -503,80 +671,161 @@ Telegram: @selfstorage_bot
 
 С уважением,
 Команда SelfStorage"""
-        )
 
 
-async def check_and_notify_overdue_orders():
-    from datetime import timedelta
-    import datetime
-    
-    today = datetime.date.today()
-    expired_orders = await get_expired_orders()
-    
-    for order in expired_orders:
-        days_expired = (today - order.end_date).days
-
-        if not order.email:
-            continue
-
-        if days_expired == 30:
-            await notify_order_overdue_30_days(order.id)
-        elif days_expired == 60:
-            await notify_order_overdue_60_days(order.id)
-        elif days_expired == 90:
-            await notify_order_overdue_90_days(order.id)
-        elif days_expired == 120:
-            await notify_order_overdue_120_days(order.id)
-        elif days_expired == 150:
-            await notify_order_overdue_150_days(order.id)
-        elif days_expired >= 180:
-            # Утилизация
-            await notify_order_about_to_be_disposed(order.id)
-            await update_order(order.id, status="DISPOSED")
-            print(f"🗑️ Заказ #{order.id} помечен как утилизированный")
-
-
-async def mark_expired_orders_auto():
-    import datetime
-    
+def overdue_letter(order: Order, days_expired: int):
+    days_to_disposal = settings.current().reminders.dispose_after_days - days_expired
+    return f"Вещи просрочены уже {_days(days_expired)}! - SelfStorage", f"""Уважаемый {order.fio or 'клиент'}!
+
+Ваши вещи просрочены уже {_days(days_expired)}.
+
+До утилизации вещей осталось {_days(days_to_disposal)}.
+
+Заказ №{order.id}
+Бокс: {order.volume}
+
+Срочно свяжитесь с нами!
+Телефон: +7-918-714-58-30
+
+С уважением,
+Команда SelfStorage"""
+
+
+# отдельные тексты для смещений из reminders.overdue_days — только если письмо уходит ровно в свой день;
+# запоздавшее (после простоя) и все остальные пишутся overdue_letter по настоящему числу дней
+OVERDUE_LETTERS = {
+    30: overdue_30_days_letter,
+    60: overdue_60_days_letter,
+    90: overdue_90_days_letter,
+    120: overdue_120_days_letter,
+    150: overdue_150_days_letter,
+}
+
+
+def _reminder_stage(today: datetime.date):
+    """Вид напоминания, которое заказ должен был получить последним к сегодняшнему дню"""
+    reminders = settings.current().reminders
+    expiring = sorted(reminders.expiring_days)
+    overdue = sorted(reminders.overdue_days, reverse=True)
+
+    return case(
+        (
+            Order.status.in_(["PAID", "IN_STORAGE"]),
+            case(
+                *[
+                    (Order.end_date <= today + datetime.timedelta(days=days), f"expiring_{days}")
+                    for days in expiring
+                ]
+            )
+        ),
+        *[
+            (Order.end_date <= today - datetime.timedelta(days=days), f"overdue_{days}")
+            for days in overdue
+        ]
+    )
+
+
+async def send_due_reminders() -> int:
+    """Ставит в очередь все наступившие и ещё не отправленные напоминания"""
     today = datetime.date.today()
-    
+    reminders = settings.current().reminders
+    expiring_until = today + datetime.timedelta(days=max(reminders.expiring_days))
+    overdue_from = today - datetime.timedelta(days=min(reminders.overdue_days))
+    dispose_date = today - datetime.timedelta(days=reminders.dispose_after_days)
+
+    stage = _reminder_stage(today).label("kind")
+    already_sent = select(NotificationLog.id).where(
+        NotificationLog.order_id == Order.id,
+        NotificationLog.kind == stage,
+        # после продления у заказа новая дата окончания — напоминания к ней ещё не отправлялись
+        NotificationLog.end_date == Order.end_date
+    ).exists()
+
     async with async_session() as session:
         result = await session.execute(
-            select(Order).where(
-                and_(
-                    Order.status.in_(["PAID", "IN_STORAGE"]),
-                    Order.end_date < today
-                )
+            select(Order, stage).where(
+                Order.email.isnot(None),
+                or_(
+                    and_(
+                        Order.status.in_(["PAID", "IN_STORAGE"]),
+                        Order.end_date.between(today, expiring_until)
+                    ),
+                    and_(
+                        Order.status == "EXPIRED",
+                        Order.end_date > dispose_date,
+                        Order.end_date <= overdue_from
+                    )
+                ),
+                ~already_sent
             )
         )
-        expired_orders = result.scalars().all()
-        
-        for order in expired_orders:
-            await session.execute(
-                update(Order).where(Order.id == order.id).values(status="EXPIRED")
-            )
-            print(f"Заказ #{order.id} помечен как просроченный")
-        
+
+        sent_log = []
+        for order, kind in result:
+            if kind.startswith("expiring_"):
+                letter = expiring_soon_letter(order, (order.end_date - today).days)
+            else:
+                days_expired = (today - order.end_date).days
+                on_time = int(kind.removeprefix("overdue_")) == days_expired
+                if on_time and days_expired in OVERDUE_LETTERS:
+                    letter = OVERDUE_LETTERS[days_expired](order)
+                else:
+                    letter = overdue_letter(order, days_expired)
+
+            enqueue_email(session, order.email, *letter)
+            sent_log.append({"order_id": order.id, "kind": kind, "end_date": order.end_date})
+
+        # уникальный (order_id, kind, end_date) не даст параллельному запуску задублировать письма:
+        # его транзакция откатится вместе с очередью
+        if sent_log:
+            await session.execute(insert(NotificationLog), sent_log)
         await session.commit()
 
+    return len(sent_log)
 
-async def check_and_notify_expiring_orders():
-    today = datetime.date.today()
-    orders = await get_orders_in_storage()
 
-    for order in orders:
-        days_left = (order.end_date - today).days
+# поля заказа, которые нужны письмам о смене статуса
+_LETTER_COLUMNS = (Order.id, Order.email, Order.fio, Order.volume, Order.end_date, Order.phone)
 
-        if days_left in [30, 14, 7, 3]:
-            await notify_order_expiring_soon(order.id, days_left)
 
+async def _transition_orders(condition, status: str, letter, session: AsyncSession | None = None) -> int:
+    """Переводит заказы в новый статус одним UPDATE и ставит письма по RETURNING"""
+    async with session_scope(session) as session:
+        result = await session.execute(
+            update(Order)
+            .where(condition)
+            .values(status=status)
+            .returning(*_LETTER_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        orders = result.all()
 
-async def mark_and_notify_expired_orders():
-    expired_orders = await get_expired_orders()
+        for order in orders:
+            enqueue_email(session, order.email, *letter(order))
 
-    for order in expired_orders:
-        await mark_order_expired(order.id)
-        await notify_order_expired(order.id)
+    return len(orders)
 
-    return len(expired_orders)
\ No newline at end of file
+
+async def expire_overdue_orders(session: AsyncSession | None = None) -> int:
+    today = datetime.date.today()
+    return await _transition_orders(
+        and_(
+            Order.status.in_(["PAID", "IN_STORAGE"]),
+            Order.end_date < today
+        ),
+        "EXPIRED",
+        expired_letter,
+        session
+    )
+
+
+async def dispose_abandoned_orders() -> int:
+    dispose_date = datetime.date.today() - datetime.timedelta(days=settings.current().reminders.dispose_after_days)
+    return await _transition_orders(
+        and_(
+            Order.status == "EXPIRED",
+            Order.end_date <= dispose_date
+        ),
+        "DISPOSED",
+        disposal_letter
+    )
@@ -1,4 +1,51 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from contextlib import asynccontextmanager
+from decouple import config
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-engine = create_async_engine(url='sqlite+aiosqlite:///db.sqlite3', echo=True)
-async_session = async_sessionmaker(engine, expire_on_commit=False)
\ No newline at end of file
+from config import DB_PATH, DB_ECHO
+
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int)
+SQLITE_MMAP_SIZE = config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)
+SQLITE_CACHE_SIZE = config('SQLITE_CACHE_SIZE', default=-64 * 1024, cast=int)
+
+# Продакшен-профиль: WAL не блокирует читателей на время записи,
+# synchronous=NORMAL в WAL теряет максимум последнюю транзакцию при сбое ОС
+PRODUCTION_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+}
+
+
+def make_engine(path: str = DB_PATH, echo: bool = DB_ECHO, pragmas: dict | None = PRODUCTION_PRAGMAS):
+    """Движок SQLite с прагмами, выставляемыми на каждом новом соединении"""
+    engine = create_async_engine(url=f'sqlite+aiosqlite:///{path}', echo=echo)
+
+    if pragmas:
+        @event.listens_for(engine.sync_engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return engine
+
+
+engine = make_engine()
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+@asynccontextmanager
+async def session_scope(session: AsyncSession | None = None):
+    """Сессия апдейта, если она передана, иначе своя транзакция с коммитом в конце"""
+    if session is not None:
+        yield session
+        return
+
+    async with async_session() as own_session:
+        yield own_session
+        await own_session.commit()
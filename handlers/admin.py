@@ -1,35 +1,43 @@
 from aiogram import Router, F, types
-from config import MANAGER_TG_ID
+from services import settings
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.repository import (
     get_all_orders, 
-    get_all_promo, 
-    count_orders_by_promo, 
-    set_promo_active,
+    get_promo_stats,
+    toggle_promo_active,
     get_orders_for_delivery,
     get_orders_in_storage,
-    get_expired_orders,
     mark_order_delivered,
     mark_order_in_storage,
     update_order,
     get_order_by_id,
     create_promo,
-    admin_check_expired_orders,
+    expire_overdue_orders,
     get_expired_status_orders,
-    get_orders_for_admin_list
+    get_orders_page
 )
-from keyboards.admin import admin_main_kb 
+from keyboards.admin import admin_main_kb, admin_orders_page_kb, admin_promo_page_kb
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from database.repository import create_promo
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from services.promo_batch import export_promo_batch
 import datetime
+import os
+import tempfile
 
 
 router = Router()
 
+ADMIN_ORDERS_PAGE_SIZE = 5
+ADMIN_PROMO_PAGE_SIZE = 10
+BULK_PROMO_MAX = 100_000
+# верхняя граница лимитов использования промокода
+PROMO_LIMIT_MAX = 1_000_000
+
 
 def is_admin(user_id: int):
-    return user_id in MANAGER_TG_ID
+    return user_id in settings.current().manager_tg_ids
 
 
 @router.message(F.text == "Админ-панель")
@@ -55,22 +63,10 @@ async def back_to_admin(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "admin_orders")
-async def admin_all_orders(callback: types.CallbackQuery):
-    if not is_admin(callback.from_user.id):
-        return
-
-    orders = await get_orders_for_admin_list()
-
-    if not orders:
-        await callback.message.answer("Заказов нет.")
-        await callback.answer()
-        return
-
-    await callback.message.answer("📋 Все заказы:\n")  # заголовок один раз
-
+def _orders_page_text(orders) -> str:
+    text = "📋 Все заказы:\n"
     for order in orders:
-        text = (
+        text += (
             "\n===============================\n"
             f"Заказ №{order.id}\n"
             f"ФИО: {order.fio}\n"
@@ -82,43 +78,60 @@ async def admin_all_orders(callback: types.CallbackQuery):
             f"Начало хранения: {order.start_date}\n"
             f"Окончание хранения: {order.end_date}\n"
             f"Цена: {order.estimated_price} ₽\n"
-            "\n===============================\n"
         )
+    return text
 
-        keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text=f"✅ Принять на склад #{order.id}",
-                        callback_data=f"confirm_storage_{order.id}"
-                    )
-                ]
-            ]
-        )
 
-        await callback.message.answer(text, reply_markup=keyboard)
+@router.callback_query(F.data == "admin_orders")
+async def admin_all_orders(callback: types.CallbackQuery, session: AsyncSession):
+    if not is_admin(callback.from_user.id):
+        return
+
+    orders, has_next = await get_orders_page(limit=ADMIN_ORDERS_PAGE_SIZE, session=session)
+
+    if not orders:
+        await callback.message.answer("Заказов нет.")
+        await callback.answer()
+        return
 
-    # кнопка "Назад" отдельным сообщением в конце
-    back_kb = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="Назад", callback_data="back_to_admin")]]
-    )
     await callback.message.answer(
-        "Назад в меню:",
-        reply_markup=back_kb
+        _orders_page_text(orders),
+        reply_markup=admin_orders_page_kb(orders, has_prev=False, has_next=has_next)
     )
-
     await callback.answer()
 
 
+@router.callback_query(F.data.startswith("orders_before_") | F.data.startswith("orders_after_"))
+async def admin_orders_page(callback: types.CallbackQuery, session: AsyncSession):
+    if not is_admin(callback.from_user.id):
+        return
+
+    # листаем одно сообщение: курсор — id крайнего заказа текущей страницы
+    direction, cursor = callback.data.removeprefix("orders_").split("_")
+    if direction == "before":
+        orders, has_next = await get_orders_page(before_id=int(cursor), limit=ADMIN_ORDERS_PAGE_SIZE, session=session)
+        has_prev = True
+    else:
+        orders, has_prev = await get_orders_page(after_id=int(cursor), limit=ADMIN_ORDERS_PAGE_SIZE, session=session)
+        has_next = True
 
+    if not orders:
+        await callback.answer("Больше заказов нет")
+        return
+
+    await callback.message.edit_text(
+        _orders_page_text(orders),
+        reply_markup=admin_orders_page_kb(orders, has_prev=has_prev, has_next=has_next)
+    )
+    await callback.answer()
 
 
 @router.callback_query(F.data == "admin_delivery")
-async def admin_delivery_orders(callback: types.CallbackQuery):
+async def admin_delivery_orders(callback: types.CallbackQuery, session: AsyncSession):
     if not is_admin(callback.from_user.id):
         return
 
-    orders = await get_orders_for_delivery()
+    orders = await get_orders_for_delivery(session)
 
     if not orders:
         await callback.message.answer(
@@ -162,12 +175,12 @@ async def admin_delivery_orders(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("delivery_detail_"))
-async def admin_delivery_detail(callback: types.CallbackQuery):
+async def admin_delivery_detail(callback: types.CallbackQuery, session: AsyncSession):
     if not is_admin(callback.from_user.id):
         return
 
     order_id = int(callback.data.replace("delivery_detail_", ""))
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
 
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -219,12 +232,12 @@ async def admin_delivery_detail(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("mark_delivered_"))
-async def admin_mark_delivered(callback: types.CallbackQuery):
+async def admin_mark_delivered(callback: types.CallbackQuery, session: AsyncSession):
     if not is_admin(callback.from_user.id):
         return
 
     order_id = int(callback.data.replace("mark_delivered_", ""))
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
 
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -232,8 +245,9 @@ async def admin_mark_delivered(callback: types.CallbackQuery):
         return
 
     # Отмечаем как доставленный и принятый на склад
-    await mark_order_delivered(order_id)
-    await mark_order_in_storage(order_id)
+    await mark_order_delivered(order_id, session)
+    await mark_order_in_storage(order_id, session)
+    await session.commit()
 
     await callback.message.answer(
         f"Заказ №{order_id} отмечен как доставленный!\n\n"
@@ -245,14 +259,15 @@ async def admin_mark_delivered(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data == "admin_storage")
-async def admin_storage_orders(callback: types.CallbackQuery):
+async def admin_storage_orders(callback: types.CallbackQuery, session: AsyncSession):
     if not is_admin(callback.from_user.id):
         return
 
-    processed = await admin_check_expired_orders()   # ✅ ДОБАВИЛИ
+    processed = await expire_overdue_orders(session)
 
-    orders = await get_orders_in_storage()
-    expired_orders = await get_expired_status_orders()
+    orders = await get_orders_in_storage(session)
+    expired_orders = await get_expired_status_orders(session)
+    await session.commit()
 
     text = "Управление складом:\n\n"
     if processed:
@@ -308,11 +323,11 @@ async def admin_storage_orders(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data == "storage_list")
-async def admin_storage_list(callback: types.CallbackQuery):
+async def admin_storage_list(callback: types.CallbackQuery, session: AsyncSession):
     if not is_admin(callback.from_user.id):
         return
 
-    orders = await get_orders_in_storage()
+    orders = await get_orders_in_storage(session)
 
     if not orders:
         await callback.message.answer(
@@ -348,13 +363,14 @@ async def admin_storage_list(callback: types.CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("confirm_storage_"))
-async def confirm_storage(callback: types.CallbackQuery):
+async def confirm_storage(callback: types.CallbackQuery, session: AsyncSession):
     if not is_admin(callback.from_user.id):
         return
 
     order_id = int(callback.data.replace("confirm_storage_", ""))
 
-    await mark_order_in_storage(order_id)
+    await mark_order_in_storage(order_id, session)
+    await session.commit()
 
     await callback.message.answer(
         f"✅ Заказ №{order_id} подтверждён как принятый на склад.",
@@ -364,11 +380,11 @@ async def confirm_storage(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data == "expired_list")
-async def admin_expired_list(callback: types.CallbackQuery):
+async def admin_expired_list(callback: types.CallbackQuery, session: AsyncSession):
     if not is_admin(callback.from_user.id):
         return
 
-    orders = await get_expired_status_orders()
+    orders = await get_expired_status_orders(session)
 
     if not orders:
         await callback.message.answer(
@@ -413,6 +429,8 @@ class AddPromo(StatesGroup):
     discount = State()
     active_from = State()
     active_to = State()
+    max_uses = State()
+    per_user_limit = State()
 
 
 @router.callback_query(F.data == "add_promo")
@@ -455,7 +473,37 @@ async def add_promo_active_from(message: types.Message, state: FSMContext):
 
 
 @router.message(AddPromo.active_to)
-async def add_promo_finish(message: types.Message, state: FSMContext):
+async def add_promo_active_to(message: types.Message, state: FSMContext):
+
+    if message.text.lower() != "нет":
+        await state.update_data(active_to=message.text)
+    else:
+        await state.update_data(active_to=None)
+
+    await message.answer("Введите общий лимит использований или напишите 'нет':")
+    await state.set_state(AddPromo.max_uses)
+
+
+@router.message(AddPromo.max_uses)
+async def add_promo_max_uses(message: types.Message, state: FSMContext):
+
+    text = (message.text or "").strip().lower()
+    if text != "нет" and (not text.isdigit() or not 0 < int(text) <= PROMO_LIMIT_MAX):
+        await message.answer(f"Введите число от 1 до {PROMO_LIMIT_MAX} или напишите 'нет':")
+        return
+
+    await state.update_data(max_uses=int(text) if text != "нет" else None)
+
+    await message.answer("Сколько раз один пользователь может применить промокод? Число или 'нет':")
+    await state.set_state(AddPromo.per_user_limit)
+
+
+@router.message(AddPromo.per_user_limit)
+async def add_promo_finish(message: types.Message, state: FSMContext, session: AsyncSession):
+    text = (message.text or "").strip().lower()
+    if text != "нет" and (not text.isdigit() or not 0 < int(text) <= PROMO_LIMIT_MAX):
+        await message.answer(f"Введите число от 1 до {PROMO_LIMIT_MAX} или напишите 'нет':")
+        return
 
     data = await state.get_data()
 
@@ -466,89 +514,187 @@ async def add_promo_finish(message: types.Message, state: FSMContext):
     else:
         active_from = None
 
-    if message.text.lower() != "нет":
+    if data.get("active_to"):
         active_to = datetime.datetime.strptime(
-            message.text, "%Y-%m-%d"
+            data.get("active_to"), "%Y-%m-%d"
         ).date()
     else:
         active_to = None
 
+    per_user_limit = int(text) if text != "нет" else None
+
     await create_promo(
         code=data.get("code"),
         discount_percent=data.get("discount"),
         active_from=active_from,
-        active_to=active_to
+        active_to=active_to,
+        max_uses=data.get("max_uses"),
+        per_user_limit=per_user_limit,
+        session=session
     )
+    await session.commit()
 
     await message.answer(f"Промокод {data.get('code')} добавлен со скидкой {data.get('discount')}%")
 
     await state.clear()
 
 
-@router.callback_query(F.data == "promo_stats")
-async def promo_stats(callback: types.CallbackQuery):
+class BulkPromo(StatesGroup):
+    count = State()
+    discount = State()
+    active_to = State()
+
 
+@router.callback_query(F.data == "bulk_promo")
+async def bulk_promo_start(callback: types.CallbackQuery, state: FSMContext):
     if not is_admin(callback.from_user.id):
         return
 
-    promos = await get_all_promo()
+    await callback.message.answer(f"Сколько одноразовых промокодов сгенерировать? (до {BULK_PROMO_MAX})")
+    await state.set_state(BulkPromo.count)
+    await callback.answer()
+
+
+@router.message(BulkPromo.count)
+async def bulk_promo_count(message: types.Message, state: FSMContext):
+    text = (message.text or "").strip()
+    if not text.isdigit() or not 0 < int(text) <= BULK_PROMO_MAX:
+        await message.answer(f"Введите число от 1 до {BULK_PROMO_MAX}:")
+        return
+
+    await state.update_data(count=int(text))
 
-    text = "Список промокодов:\n"
+    await message.answer("Введите процент скидки:")
+    await state.set_state(BulkPromo.discount)
 
-    if not promos:
-        await callback.message.answer("Промокодов нет.")
+
+@router.message(BulkPromo.discount)
+async def bulk_promo_discount(message: types.Message, state: FSMContext):
+    text = (message.text or "").strip()
+    if not text.isdigit() or not 0 < int(text) <= 100:
+        await message.answer("Введите процент скидки числом от 1 до 100:")
         return
 
-    for promo in promos:
-        count = await count_orders_by_promo(promo.code)
-        text += f"{promo.code} — использован {count} раз\n"
+    await state.update_data(discount=int(text))
 
-        status = "🟢 Активен" if promo.is_active else "🔴 Неактивен"
+    await message.answer("Введите дату окончания (гггг-мм-дд) или напишите 'нет':")
+    await state.set_state(BulkPromo.active_to)
 
-        keyboard = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text="Выключить" if promo.is_active else "Включить",
-                        callback_data=f"toggle_promo_{promo.code}"
-                    )
-                ]
-            ]
+
+@router.message(BulkPromo.active_to)
+async def bulk_promo_finish(message: types.Message, state: FSMContext):
+    text = (message.text or "").strip()
+    if text.lower() == "нет":
+        active_to = None
+    else:
+        try:
+            active_to = datetime.datetime.strptime(text, "%Y-%m-%d").date()
+        except ValueError:
+            await message.answer("Введите дату в формате гггг-мм-дд или напишите 'нет':")
+            return
+
+    data = await state.get_data()
+    await state.clear()
+
+    await message.answer("Генерирую промокоды, это может занять несколько секунд...")
+
+    # CSV пишется на диск по пачкам и отдаётся файлом, а не собирается в памяти
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.csv')
+    temp_file.close()
+
+    try:
+        created = await export_promo_batch(
+            temp_file.name,
+            count=data.get("count"),
+            discount_percent=data.get("discount"),
+            active_to=active_to
+        )
+        await message.answer_document(
+            FSInputFile(temp_file.name, filename=f"promo_{datetime.date.today()}_{created}.csv"),
+            caption=f"Сгенерировано {created} одноразовых промокодов со скидкой {data.get('discount')}%"
         )
+    finally:
+        os.unlink(temp_file.name)
 
-        await callback.message.answer(
-            f"Промокод: {promo.code}\n"
+
+def _promo_page_text(rows) -> str:
+    text = "Список промокодов:\n"
+    for promo, orders_count, revenue, last_used in rows:
+        status = "🟢 Активен" if promo.is_active else "🔴 Неактивен"
+        text += (
+            f"\nПромокод: {promo.code}\n"
             f"Скидка: {promo.discount_percent}%\n"
             f"Дата начала: {promo.active_from}\n"
             f"Дата окончания: {promo.active_to}\n"
-            f"Статус: {status}",
-            reply_markup=keyboard
+            f"Статус: {status}\n"
+            f"Использован: {orders_count} раз, выручка: {revenue} ₽\n"
+            f"Лимит: {promo.max_uses or 'нет'}, на пользователя: {promo.per_user_limit or 'нет'}\n"
+            f"Последнее использование: {last_used or 'нет'}\n"
         )
+    return text
+
+
+@router.callback_query(F.data == "promo_stats")
+async def promo_stats(callback: types.CallbackQuery, session: AsyncSession):
+
+    if not is_admin(callback.from_user.id):
+        return
+
+    rows, has_next = await get_promo_stats(limit=ADMIN_PROMO_PAGE_SIZE, session=session)
+
+    if not rows:
+        await callback.message.answer("Промокодов нет.")
+        await callback.answer()
+        return
+
+    await callback.message.answer(
+        _promo_page_text(rows),
+        reply_markup=admin_promo_page_kb([row[0] for row in rows], has_prev=False, has_next=has_next)
+    )
+    await callback.answer()
+
 
-    await callback.message.answer(text)
+@router.callback_query(F.data.startswith("promos_before_") | F.data.startswith("promos_after_"))
+async def promo_stats_page(callback: types.CallbackQuery, session: AsyncSession):
+
+    if not is_admin(callback.from_user.id):
+        return
+
+    direction, cursor = callback.data.removeprefix("promos_").split("_")
+    if direction == "before":
+        rows, has_next = await get_promo_stats(before_id=int(cursor), limit=ADMIN_PROMO_PAGE_SIZE, session=session)
+        has_prev = True
+    else:
+        rows, has_prev = await get_promo_stats(after_id=int(cursor), limit=ADMIN_PROMO_PAGE_SIZE, session=session)
+        has_next = True
+
+    if not rows:
+        await callback.answer("Больше промокодов нет")
+        return
+
+    await callback.message.edit_text(
+        _promo_page_text(rows),
+        reply_markup=admin_promo_page_kb([row[0] for row in rows], has_prev=has_prev, has_next=has_next)
+    )
     await callback.answer()
 
 
 @router.callback_query(F.data.startswith("toggle_promo_"))
-async def toggle_promo(callback: types.CallbackQuery):
+async def toggle_promo(callback: types.CallbackQuery, session: AsyncSession):
 
     if not is_admin(callback.from_user.id):
         return
 
     code = callback.data.replace("toggle_promo_", "")
 
-    promos = await get_all_promo()
+    new_status = await toggle_promo_active(code, session)
+    await session.commit()
 
-    for promo in promos:
-        if promo.code == code:
-            new_status = not promo.is_active
-            await set_promo_active(code, new_status)
+    if new_status is not None:
+        status_text = "включен" if new_status else "выключен"
 
-            status_text = "включен" if new_status else "выключен"
-
-            await callback.message.answer(
-                f"Промокод {code} теперь {status_text}."
-            )
-            break
+        await callback.message.answer(
+            f"Промокод {code} теперь {status_text}."
+        )
 
-    await callback.answer()
\ No newline at end of file
+    await callback.answer()
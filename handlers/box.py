@@ -1,5 +1,3 @@
-import os
-import tempfile
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -10,8 +8,7 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import (
     ReplyKeyboardRemove, 
     InlineKeyboardMarkup, 
-    InlineKeyboardButton, 
-    FSInputFile
+    InlineKeyboardButton
 )
 from keyboards.box import (
     generate_delivery_method_kb,
@@ -23,23 +20,18 @@ from keyboards.box import (
     generate_payment_kb,
     generate_payment_success_kb
 )
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.repository import (
     create_order, 
     get_or_create_user, 
-    get_valid_promo, 
-    increase_promo_usage, 
+    redeem_promo,
     get_order_by_id,
-    update_order,
-    send_real_email,
-    notify_order_expiring_soon,
-    notify_order_expired,
     mark_order_paid
 )
+from services import promo_index, qr, settings
 from keyboards.menu import main_menu_kb
 from decouple import config
-from config import BOXES, DELIVERY_SETTINGS, DB, PROMO_CODES, WAREHOUSE_ADDRESS
 from datetime import datetime, timedelta
-import qrcode
 
 
 router = Router()
@@ -74,25 +66,6 @@ def generate_payment_url(order_id: int, amount: int, description: str):
     return f"{base_url}?{urlencode(params)}"
 
 
-def generate_qr_code_file(payment_url: str):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(payment_url)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-    img.save(temp_file.name, 'PNG')
-    temp_file.close()
-    
-    return temp_file.name
-
-
 @router.message(F.text == "Арендовать бокс")
 @router.callback_query(F.data == "pick_box")
 async def start_rent_box(event: types.Message | types.CallbackQuery, state: FSMContext):
@@ -110,13 +83,13 @@ async def start_rent_box(event: types.Message | types.CallbackQuery, state: FSMC
 async def show_boxes(message: types.Message, state: FSMContext):
     text = "Доступные боксы для аренды:\n\n"
 
-    for box in BOXES:
+    for box in settings.current().boxes:
         text += (
-            f"{box['name']}\n"
-            f"Размер: {box['size']}\n"
-            f"Габариты: {box['dimensions']}\n"
-            f"Цена: {box['price_per_month']} ₽/мес\n"
-            f"{box['description']}\n\n"
+            f"{box.name}\n"
+            f"Размер: {box.size}\n"
+            f"Габариты: {box.dimensions}\n"
+            f"Цена: {box.price_per_month} ₽/мес\n"
+            f"{box.description}\n\n"
         )
 
     text += "Выберите подходящий бокс или закажите замеры:"
@@ -127,20 +100,30 @@ async def show_boxes(message: types.Message, state: FSMContext):
     )
 
 
+def _selected_box(data: dict) -> settings.Box | None:
+    """Выбранный бокс по id из состояния, с ценой на момент выбора"""
+    box = settings.current().boxes_by_id.get(data.get("box_id"))
+    if box and "box_price" in data:
+        box = box._replace(price_per_month=data["box_price"])
+    return box
+
+
 @router.callback_query(F.data.startswith("select_box_"))
 async def process_select_box(callback: types.CallbackQuery, state: FSMContext):
     box_id = callback.data.replace("select_box_", "")
-    box = next((b for b in BOXES if b["id"] == box_id), None)
+    box = settings.current().boxes_by_id.get(box_id)
 
     if box:
-        await state.update_data(selected_box=box)
+        # в состоянии только id и цена: цена фиксируется на момент выбора,
+        # даже если тариф обновят посреди оформления
+        await state.update_data(box_id=box.id, box_price=box.price_per_month)
 
         await callback.message.answer(
-            f"Вы выбрали: {box['name']}\n\n"
-            f"Объём: {box['size']}\n"
-            f"Габариты: {box['dimensions']}\n"
-            f"Стоимость: {box['price_per_month']} ₽/мес\n"
-            f"{box['description']}\n\n"
+            f"Вы выбрали: {box.name}\n\n"
+            f"Объём: {box.size}\n"
+            f"Габариты: {box.dimensions}\n"
+            f"Стоимость: {box.price_per_month} ₽/мес\n"
+            f"{box.description}\n\n"
             "Выберите срок аренды:",
             reply_markup=generate_rental_period_kb()
         )
@@ -161,11 +144,16 @@ async def process_rental_period(callback: types.CallbackQuery, state: FSMContext
     months, period_text = period_map.get(period_key, (1, "1 месяц"))
     
     data = await state.get_data()
-    box = data.get("selected_box", {})
+    box = _selected_box(data)
+    if box is None:
+        await callback.message.answer("Выбранный бокс больше недоступен, выберите другой.")
+        await show_boxes(callback.message, state)
+        await callback.answer()
+        return
     
     await state.update_data(rental_months=months, rental_period_text=period_text)
     
-    base_price = box.get("price_per_month", 0)
+    base_price = box.price_per_month
     total_price = base_price * months
 
     await state.update_data(total_price=total_price)
@@ -197,15 +185,16 @@ async def process_fio(message: types.Message, state: FSMContext):
 
 @router.message(RentBox.delivery_method, F.text == "Самовывоз")
 async def process_self_delivery(message: types.Message, state: FSMContext):
+    warehouse_address = settings.current().warehouse_address
     await state.update_data(
         delivery_method="Самовывоз",
-        address=WAREHOUSE_ADDRESS,
+        address=warehouse_address,
         is_self_delivery=True,
         is_delivery_required=False
     )
 
     await message.answer(
-        f"Адрес склада для самовывоза: {WAREHOUSE_ADDRESS}\n\n"
+        f"Адрес склада для самовывоза: {warehouse_address}\n\n"
         "При приёме вещей на склад наши специалисты произведут замеры габаритов ваших вещей.\n\n"
         "Отправьте номер телефона для связи:",
         reply_markup=generate_request_contact_kb()
@@ -268,33 +257,32 @@ async def process_email(message: types.Message, state: FSMContext):
 
 
 @router.callback_query(F.data == "skip_promocode")
-async def process_skip_promocode(callback: types.CallbackQuery, state: FSMContext):
+async def process_skip_promocode(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession):
     await state.update_data(promo_code=None, discount_percent=0)
-    await process_final_summary(callback.message,state,callback.from_user.id)
+    await process_final_summary(callback.message,state,callback.from_user.id, session)
     await state.clear()
     await callback.answer()
 
 
 @router.message(RentBox.promo)
-async def process_promo(message: types.Message, state: FSMContext):
+async def process_promo(message: types.Message, state: FSMContext, session: AsyncSession):
     promo_code = message.text.strip()
 
     if promo_code.lower() == "нет":
         await state.update_data(promo_code=None, discount_percent=0)
-        await process_final_summary(message, state, message.from_user.id)
+        await process_final_summary(message, state, message.from_user.id, session)
         return
 
-    promo = await get_valid_promo(promo_code)
+    promo = await promo_index.get_valid_promo(promo_code)
 
     if promo:
         discount_percent = promo.discount_percent
-        await increase_promo_usage(promo_code)
         await message.answer(
             f"Поздравляем! Вы получили скидку {discount_percent}%",
             reply_markup=ReplyKeyboardRemove()
         )
         await state.update_data(
-            promo_code=promo_code, 
+            promo_code=promo.code,
             discount_percent=discount_percent
         )
     else:
@@ -305,13 +293,16 @@ async def process_promo(message: types.Message, state: FSMContext):
         )
         return
 
-    await process_final_summary(message, state, message.from_user.id)
+    await process_final_summary(message, state, message.from_user.id, session)
 
 
 
-async def process_final_summary(message: types.Message, state: FSMContext, telegram_id: int):
+async def process_final_summary(message: types.Message, state: FSMContext, telegram_id: int, session: AsyncSession):
     data = await state.get_data()
-    box = data.get("selected_box", {})
+    box = _selected_box(data)
+    if box is None:
+        await message.answer("Выбранный бокс больше недоступен, начните оформление заново.")
+        return
     delivery = data.get("delivery_method", "Самовывоз")
     address = data.get("address", "Не указан")
     contact = data.get("contact")
@@ -328,12 +319,23 @@ async def process_final_summary(message: types.Message, state: FSMContext, teleg
     start_date = datetime.now().date()
     end_date = start_date + timedelta(days=30 * rental_months)
 
-    volume_text = f"{box.get('name', '')} ({box.get('size', '')})"
-    base_price = box.get("price_per_month", 0)
+    user_id, _ = await get_or_create_user(telegram_id, session)
+
+    # использование списывается здесь, в одной транзакции с созданием заказа
+    promo_unavailable = None
+    if promo_code:
+        discount_percent = await redeem_promo(promo_code, user_id, session)
+        if discount_percent is None:
+            promo_unavailable = promo_code
+            promo_code = None
+            discount_percent = 0
+
+    volume_text = f"{box.name} ({box.size})"
+    base_price = box.price_per_month
     total_base = base_price * rental_months
 
     if is_self_delivery:
-        price_after_self_delivery = int(total_base * DELIVERY_SETTINGS["self_delivery_discount"])
+        price_after_self_delivery = int(total_base * settings.current().delivery.self_delivery_discount)
         self_delivery_discount = total_base - price_after_self_delivery
     else:
         price_after_self_delivery = total_base
@@ -354,10 +356,8 @@ async def process_final_summary(message: types.Message, state: FSMContext, teleg
         else:
             price_text = f"{price} ₽"
 
-    user, created = await get_or_create_user(telegram_id)
-
     order = await create_order(
-        user_id=user.id,
+        user_id=user_id,
         fio=fio,
         volume=volume_text,
         delivery_type=delivery,
@@ -368,13 +368,20 @@ async def process_final_summary(message: types.Message, state: FSMContext, teleg
         email=email,
         start_date=start_date,
         end_date=end_date,
-        is_delivery_required=is_delivery_required
+        is_delivery_required=is_delivery_required,
+        session=session
     )
+    await session.commit()
+
+    if promo_unavailable:
+        await message.answer(
+            f"Промокод {promo_unavailable} больше недоступен, заказ оформлен без скидки."
+        )
 
     order_id = order.id
 
     if is_self_delivery:
-        address_text = f"Самовывоз со склада: {WAREHOUSE_ADDRESS}"
+        address_text = f"Самовывоз со склада: {settings.current().warehouse_address}"
         measurement_note = "Замеры будут произведены при приёме вещей на склад"
     else:
         address_text = f"Адрес для вывоза: {address}"
@@ -437,10 +444,10 @@ async def process_final_summary(message: types.Message, state: FSMContext, teleg
 
 
 @router.callback_query(F.data.startswith("pay_order_"))
-async def process_pay_order(callback: types.CallbackQuery, state: FSMContext):
+async def process_pay_order(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession):
     order_id = int(callback.data.replace("pay_order_", ""))
 
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -455,11 +462,9 @@ async def process_pay_order(callback: types.CallbackQuery, state: FSMContext):
         description=description
     )
 
-    qr_file_path = generate_qr_code_file(payment_url)
-    qr_image = FSInputFile(qr_file_path)
-
-    await callback.message.answer_photo(
-        photo=qr_image,
+    await qr.answer_qr(
+        callback.message,
+        payment_url,
         caption=(
             f"Сканируйте QR-код для оплаты\n\n"
             f"Заказ: #{order_id}\n"
@@ -468,32 +473,23 @@ async def process_pay_order(callback: types.CallbackQuery, state: FSMContext):
         ),
         reply_markup=generate_payment_kb(order_id, payment_url)
     )
-
-    try:
-        os.unlink(qr_file_path)
-    except:
-        pass
     
     await callback.answer()
 
 
 @router.callback_query(F.data.startswith("check_payment_"))
-async def process_check_payment(callback: types.CallbackQuery, state: FSMContext):
+async def process_check_payment(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession):
     order_id = int(callback.data.replace("check_payment_", ""))
     
-    order = await get_order_by_id(order_id)
+    order = await mark_order_paid(order_id, session)
+    await session.commit()
     
     if not order:
         await callback.message.answer("Заказ не найден")
         await callback.answer()
         return
 
-    current_date = datetime.now().date()
-
-    await update_order(order_id, status="PAID", start_date=current_date)
-
-    order = await get_order_by_id(order_id)
-    await mark_order_paid(order_id)
+    current_date = order.start_date
 
     success_kb = InlineKeyboardMarkup(
         inline_keyboard=[
@@ -512,27 +508,6 @@ async def process_check_payment(callback: types.CallbackQuery, state: FSMContext
         ]
     )
 
-    await send_real_email(
-        email=order.email,
-        subject="Оплата заказа принята - SelfStorage",
-        message=f"""Уважаемый {order.fio or 'клиент'}!
-
-Ваш заказ №{order_id} успешно оплачен!
-
-Детали заказа:
-Бокс: {order.volume}
-Период аренды: с {order.start_date} по {order.end_date}
-Сумма: {order.estimated_price} ₽
-Способ доставки: {order.delivery_type}
-
-Статус:
-{'Доставка запланирована' if order.is_delivery_required else 'Ждем вас на складе'}
-
-Если вы заказали доставку, наш менеджер свяжется с вами в ближайшее время для уточнения деталей.
-Спасибо за выбор SelfStorage!
-"""
-    )
-
     await callback.message.answer(
         f"Оплата прошла успешно!\n\n"
         f"Заказ: #{order_id}:\n\n"
@@ -540,7 +515,7 @@ async def process_check_payment(callback: types.CallbackQuery, state: FSMContext
         f"Дата начала: {current_date.strftime('%d.%m.%Y')}\n"
         f"Дата окончания: {order.end_date.strftime('%d.%m.%Y')}\n\n"
         f"Чек отправлен на вашу почту {order.email}\n\n"
-        f"{'Наш менеджер свяжется с вами для уточнения деталей доставки.' if order.is_delivery_required else 'Ждем вас на складе по адресу: ' + WAREHOUSE_ADDRESS}\n\n"
+        f"{'Наш менеджер свяжется с вами для уточнения деталей доставки.' if order.is_delivery_required else 'Ждем вас на складе по адресу: ' + settings.current().warehouse_address}\n\n"
         f"Спасибо за заказ!",
         reply_markup=success_kb
     )
@@ -1,3 +1,4 @@
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.repository import get_or_create_user, get_user_orders
 from aiogram import Router, F, types
 
@@ -7,7 +8,7 @@ router = Router()
 
 @router.message(F.text == "Мои заказы")
 @router.callback_query(F.data == "my_orders")
-async def my_orders(event: types.Message | types.CallbackQuery):
+async def my_orders(event: types.Message | types.CallbackQuery, session: AsyncSession):
     STATUS_TRANSLATIONS = {
         "CREATED": "Создано",
         "PAID": "Оплачен",
@@ -23,8 +24,9 @@ async def my_orders(event: types.Message | types.CallbackQuery):
         message = event
         tg_id = event.from_user.id
 
-    user, _ = await get_or_create_user(tg_id)
-    orders = await get_user_orders(user.id)
+    user_id, _ = await get_or_create_user(tg_id, session)
+    await session.commit()
+    orders = await get_user_orders(user_id, session)
 
 
     if not orders:
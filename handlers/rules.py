@@ -1,10 +1,12 @@
 from aiogram import F, Router, types
 from keyboards.rules import generate_rules, generate_prohibited_kb
 from decouple import config
-from config import PROHIBITED_KEYWORDS, ALLOWED_KEYWORDS, BOXES, MANAGER_PHONE
+from services import settings
 from aiogram.types import CallbackQuery, ReplyKeyboardRemove
 from handlers.box import RentBox
 from keyboards.menu import main_menu_kb
+from services import item_checker
+from services.item_checker import Verdict
 
 
 router = Router()
@@ -38,59 +40,74 @@ async def rule(message: types.Message):
         "FAQ — можно ли хранить жидкости?\n"
         "- Небольшие бытовые герметичные емкости (вода в плотно закрытой таре) обычно допустимы.\n"
         "- Горючие, токсичные или коррозионные жидкости запрещены — их хранение опасно.\n\n"
-        "Чтобы проверить конкретный предмет, просто напишите его название (например: «бензин», «диван», «лыжи»)."
+        "Чтобы проверить конкретный предмет, просто напишите его название (например: «бензин», «диван», «лыжи»)\n"
+        "или пришлите весь список через запятую — проверим каждую вещь."
     )
     await message.answer(text, reply_markup=generate_rules())
 
 
+ITEM_MARKS = {"allowed": "✅", "prohibited": "⛔", "unknown": "❓"}
+# Telegram не принимает сообщения длиннее 4096 символов — длинный список режем на части
+ITEMS_MESSAGE_LIMIT = 4000
+
+
+def _items_table(items: list[tuple[str, Verdict]]) -> list[str]:
+    """Ответ на список вещей: одна строка на вещь, разбитый на сообщения не длиннее лимита"""
+    messages = []
+    current = "Результат проверки списка:\n"
+    for item, verdict in items:
+        guess = f" (возможно, вы имели в виду «{verdict.keyword}»)" if verdict.guess else ""
+        if verdict.status == "prohibited":
+            status = f"запрещено — {verdict.reason}"
+        elif verdict.status == "allowed":
+            status = "разрешено"
+        else:
+            status = "нужно уточнить у оператора"
+        line = f"{ITEM_MARKS[verdict.status]} {item}{guess}: {status}"[:ITEMS_MESSAGE_LIMIT]
+        if len(current) + 1 + len(line) > ITEMS_MESSAGE_LIMIT:
+            messages.append(current)
+            current = line
+        else:
+            current += "\n" + line
+    messages.append(current)
+    return messages
+
+
 @router.message(~F.text.in_(ADMIN_COMMANDS))
 @router.message()
 async def check_item(message: types.Message):
-    text = message.text.lower()
-    prohibited_found = [kw for kw in PROHIBITED_KEYWORDS if kw.lower() in text]
-    if prohibited_found:
-        reasons = {
-            "бензин": "горючая жидкость, пожароопасно",
-            "дизель": "горючая жидкость, пожароопасно",
-            "солярка": "горючая жидкость, пожароопасно",
-            "керосин": "горючая жидкость, пожароопасно",
-            "растворитель": "легковоспламеняющаяся жидкость",
-            "лак": "легковоспламеняющаяся жидкость",
-            "краска": "легковоспламеняющаяся жидкость",
-            "газовый баллон": "взрывоопасно",
-            "баллон": "взрывоопасно",
-            "взрывчат": "взрывоопасно",
-            "яд": "ядовито",
-            "ядовит": "ядовито",
-            "радиоактив": "радиоактивно",
-            "радиация": "радиоактивно",
-            "хлор": "коррозионно и токсично",
-            "кислота": "коррозионно",
-            "щелочь": "коррозионно",
-            "корроз": "коррозионно",
-            "живот": "живые организмы запрещены",
-            "живые": "живые организмы запрещены",
-            "органика (гнилостная)": "гнилостная органика",
-            "легковоспламеняющиеся": "легковоспламеняющиеся вещества",
-            "огнеопасно": "огнеопасно"
-        }
-        reason = reasons.get(prohibited_found[0], "запрещено по правилам безопасности")
+    items = item_checker.checker.classify_items(message.text)
+
+    if len(items) > 1:
+        all_allowed = all(verdict.status == "allowed" for _, verdict in items)
+        *head, last = _items_table(items)
+        for text in head:
+            await message.answer(text)
+        await message.answer(
+            last,
+            reply_markup=main_menu_kb(message.from_user.id) if all_allowed else generate_prohibited_kb()
+        )
+        return
+
+    verdict = items[0][1] if items else Verdict("unknown")
+
+    if verdict.status == "prohibited":
         await message.answer(
-            f"Этот предмет запрещён к хранению по причине: {reason}. Предлагаем вариант - связаться с оператором.",
+            f"Этот предмет запрещён к хранению по причине: {verdict.reason}. Предлагаем вариант - связаться с оператором.",
             reply_markup=generate_prohibited_kb()
         )
         return
 
-    allowed_found = [kw for kw in ALLOWED_KEYWORDS if kw.lower() in text]
-    if allowed_found:
+    if verdict.status == "allowed":
         await message.answer(
             "Этот предмет разрешён к хранению.",
             reply_markup=main_menu_kb(message.from_user.id),
         )
         return
     
+    guess = f"Возможно, вы имели в виду «{verdict.keyword}»? " if verdict.guess else ""
     await message.answer(
-        "Не уверен, разрешён ли этот предмет. Свяжитесь с оператором для уточнения.",
+        f"{guess}Не уверен, разрешён ли этот предмет. Свяжитесь с оператором для уточнения.",
         reply_markup=generate_prohibited_kb()
     )
 
@@ -98,10 +115,11 @@ async def check_item(message: types.Message):
 @router.callback_query(F.data == "contact_operator")
 async def contact_operator(callback: CallbackQuery):
     tg_link = f"tg://user?id={config('ADMIN_CHAT_ID')}"
+    manager_phone = settings.current().manager_phone
     
     text = (
         "Связь с оператором\n\n"
-        f"Телефон: <a href=\"tel:{MANAGER_PHONE}\">{MANAGER_PHONE}</a>\n"
+        f"Телефон: <a href=\"tel:{manager_phone}\">{manager_phone}</a>\n"
         f"Telegram: <a href=\"{tg_link}\">Написать менеджеру</a>\n\n"
         "Наш менеджер поможет подобрать бокс, ответить на вопросы по условиям хранения или оформить заказ."
     )
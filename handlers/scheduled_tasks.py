@@ -1,6 +1,6 @@
 import asyncio
 from datetime import datetime
-from database.repository import check_and_notify_expiring_orders, mark_and_notify_expired_orders
+from database.repository import send_due_reminders, expire_overdue_orders
 from decouple import config
 import logging
 
@@ -12,13 +12,13 @@ async def run_daily_checks():
     logger.info("Запуск ежедневной проверки заказов...")
     
     try:
-        await check_and_notify_expiring_orders()
+        await send_due_reminders()
         logger.info("Напоминания отправлены")
     except Exception as e:
         logger.error(f"Ошибка при отправке напоминаний: {e}")
 
     try:
-        expired_count = await mark_and_notify_expired_orders()
+        expired_count = await expire_overdue_orders()
         if expired_count > 0:
             logger.info(f"Просрочено {expired_count} заказов")
     except Exception as e:
@@ -1,8 +1,8 @@
 from aiogram import Router, types
 from aiogram.filters import Command
 from keyboards.menu import main_menu_kb
-from aiogram.types import FSInputFile
-from config import PD_PDF_PATH
+from services import media, settings
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.repository import get_or_create_user
 
 
@@ -10,13 +10,14 @@ router = Router()
 
 
 @router.message(Command("start"))
-async def start_bot(message: types.Message):
-    user, is_new = await get_or_create_user(message.from_user.id)
+async def start_bot(message: types.Message, session: AsyncSession):
+    await get_or_create_user(message.from_user.id, session)
+    await session.commit()
 
-    pdf = FSInputFile(PD_PDF_PATH)
-
-    await message.answer_document(
-        document=pdf,
+    await media.answer_document(
+        message,
+        settings.current().pd_pdf_path,
+        session,
         caption=(
             "Перед началом работы с ботом ознакомьтесь, пожалуйста,\nс согласием на обработку персональных данных."
         )
@@ -1,12 +1,13 @@
 from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.repository import (
     get_or_create_user, 
     get_user_orders, 
     get_order_by_id,
     update_order,
-    send_real_email
+    queue_email
 )
 from keyboards.menu import main_menu_kb
 from keyboards.things import (
@@ -20,10 +21,7 @@ from keyboards.things import (
     confirm_pickup_kb
 )
 from datetime import datetime, timedelta
-from config import BOXES, WAREHOUSE_ADDRESS, DELIVERY_SETTINGS, MANAGER_TG_ID
-import qrcode
-import tempfile
-import os
+from services import qr, settings
 
 
 router = Router()
@@ -34,30 +32,12 @@ class ExtendOrder(StatesGroup):
     confirm = State()
 
 
-def generate_qr_code(data):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-    img.save(temp_file.name, 'PNG')
-    temp_file.close()
-    
-    return temp_file.name
-
-
 @router.message(F.text == "Список вещей")
-async def my_items(message: types.Message):
-    user, _ = await get_or_create_user(message.from_user.id)
+async def my_items(message: types.Message, session: AsyncSession):
+    user_id, _ = await get_or_create_user(message.from_user.id, session)
+    await session.commit()
     
-    orders = await get_user_orders(user.id)
+    orders = await get_user_orders(user_id, session)
     
     active_orders = [
         order for order in orders 
@@ -125,10 +105,10 @@ async def my_items(message: types.Message):
     )
 
 @router.callback_query(F.data.startswith("pickup_full_"))
-async def pickup_full(callback: types.CallbackQuery):
+async def pickup_full(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("pickup_full_", ""))
     
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -146,10 +126,10 @@ async def pickup_full(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("pickup_partial_"))
-async def pickup_partial(callback: types.CallbackQuery):
+async def pickup_partial(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("pickup_partial_", ""))
     
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -168,18 +148,19 @@ async def pickup_partial(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("pickup_delivery_"))
-async def pickup_delivery(callback: types.CallbackQuery):
+async def pickup_delivery(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("pickup_delivery_", ""))
     
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
         await callback.answer()
         return
 
-    base_delivery = DELIVERY_SETTINGS.get('pickup_service_base', 500)
-    price_per_km = DELIVERY_SETTINGS.get('pickup_per_km', 15)
+    delivery = settings.current().delivery
+    base_delivery = delivery.pickup_service_base
+    price_per_km = delivery.pickup_per_km
     
     await callback.message.answer(
         f"Доставка вещей на дом\n\n"
@@ -196,10 +177,10 @@ async def pickup_delivery(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("pickup_self_"))
-async def pickup_self(callback: types.CallbackQuery):
+async def pickup_self(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("pickup_self_", ""))
     
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -207,22 +188,23 @@ async def pickup_self(callback: types.CallbackQuery):
         return
 
     qr_data = f"SELFSTORAGE_PICKUP:{order_id}:{order.fio or 'CLIENT'}"
-    qr_path = generate_qr_code(qr_data)
+    warehouse_address = settings.current().warehouse_address
     
-    await callback.message.answer_photo(
-        photo=types.FSInputFile(qr_path),
+    await qr.answer_qr(
+        callback.message,
+        qr_data,
         caption=(
             f"Самовывоз со склада\n\n"
             f"Заказ #{order.id}\n"
             f"Бокс: {order.volume}\n\n"
-            f"Адрес склада:\n{WAREHOUSE_ADDRESS}\n\n"
+            f"Адрес склада:\n{warehouse_address}\n\n"
             f"Предъявите QR-код сотруднику склада для получения вещей.\n\n"
             f"Время работы: Ежедневно с 9:00 до 21:00"
         )
     )
 
     if order.email:
-        await send_real_email(
+        await queue_email(
             email=order.email,
             subject=f"QR-код для получения вещей - Заказ #{order.id}",
             message=f"""Уважаемый {order.fio or 'клиент'}!
@@ -230,16 +212,13 @@ async def pickup_self(callback: types.CallbackQuery):
 			Детали заказа:
 			Заказ №{order.id}
 			Бокс: {order.volume}
-			Адрес склада: {WAREHOUSE_ADDRESS}
+			Адрес склада: {warehouse_address}
 			QR-код для получения вещей был отправлен в этом чате.
 			С уважением,
-			Команда SelfStorage"""
+			Команда SelfStorage""",
+            session=session
         )
-    
-    try:
-        os.unlink(qr_path)
-    except:
-        pass
+        await session.commit()
     
     await callback.message.answer(
         "Вы можете забрать вещи со склада.\n\n"
@@ -250,10 +229,10 @@ async def pickup_self(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("pickup_delivery_home_"))
-async def pickup_delivery_home(callback: types.CallbackQuery):
+async def pickup_delivery_home(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("pickup_delivery_home_", ""))
     
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -262,10 +241,10 @@ async def pickup_delivery_home(callback: types.CallbackQuery):
     
 
     qr_data = f"SELFSTORAGE_PICKUP:{order_id}:{order.fio or 'CLIENT'}"
-    qr_path = generate_qr_code(qr_data)
 
-    await callback.message.answer_photo(
-        photo=types.FSInputFile(qr_path),
+    await qr.answer_qr(
+        callback.message,
+        qr_data,
         caption=(
             f"Доставка вещей\n\n"
             f"Заказ #{order.id}\n"
@@ -275,14 +254,8 @@ async def pickup_delivery_home(callback: types.CallbackQuery):
             f"Менеджер свяжется с вами для подтверждения времени доставки."
         )
     )
-    
-    try:
-        os.unlink(qr_path)
-    except:
-        pass
 
-    from config import MANAGER_TG_ID
-    for manager_id in MANAGER_TG_ID:
+    for manager_id in settings.current().manager_tg_ids:
         try:
             await callback.message.bot.send_message(
                 manager_id,
@@ -298,15 +271,17 @@ async def pickup_delivery_home(callback: types.CallbackQuery):
             pass
 
     if order.email:
-        await send_real_email(
+        await queue_email(
             email=order.email,
             subject=f"Доставка вещей - Заказ #{order.id}",
             message=f"""Уважаемый {order.fio or 'клиент'}!
                 Вы запросили доставку вещей на дом!
                 Детали заказа: Заказ №{order.id} Бокс: {order.volume} Адрес доставки: {order.address}
                 Менеджер свяжется с вами в ближайшее время для подтверждения времени доставки.
-                С уважением, Команда SelfStorage""" 
+                С уважением, Команда SelfStorage""",
+            session=session
         )
+        await session.commit()
 
         await callback.message.answer(
             "Запрос на доставку оформлен!\n\n"
@@ -318,12 +293,12 @@ async def pickup_delivery_home(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("confirm_pickup_"))
-async def confirm_pickup(callback: types.CallbackQuery):
+async def confirm_pickup(callback: types.CallbackQuery, session: AsyncSession):
     parts = callback.data.split("_")
     order_id = int(parts[2])
     pickup_type = parts[3]
     
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("❌ Заказ не найден")
@@ -331,17 +306,17 @@ async def confirm_pickup(callback: types.CallbackQuery):
         return
 
     qr_data = f"SELFSTORAGE_PICKUP:{order_id}:{order.fio or 'CLIENT'}"
-    qr_path = generate_qr_code(qr_data)
     
     if pickup_type == "self":
-        address_text = WAREHOUSE_ADDRESS
+        address_text = settings.current().warehouse_address
         action_text = "самовывоз"
     else:
         address_text = order.address
         action_text = "доставка"
     
-    await callback.message.answer_photo(
-        photo=types.FSInputFile(qr_path),
+    await qr.answer_qr(
+        callback.message,
+        qr_data,
         caption=(
             f"Подтверждение забора вещей\n\n"
             f"Заказ #{order.id}\n"
@@ -351,13 +326,9 @@ async def confirm_pickup(callback: types.CallbackQuery):
             f"Время работы склада: Ежедневно 9:00-21:00"
         )
     )
-    
-    try:
-        os.unlink(qr_path)
-    except:
-        pass
 
-    await update_order(order_id, status="COMPLETED")
+    await update_order(order_id, status="COMPLETED", session=session)
+    await session.commit()
     
     await callback.message.answer(
         f"Забор вещей подтверждён!\n\n"
@@ -381,10 +352,10 @@ async def cancel_pickup(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("extend_order_"))
-async def extend_order(callback: types.CallbackQuery):
+async def extend_order(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("extend_order_", ""))
     
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -402,25 +373,25 @@ async def extend_order(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("extend_1_"))
-async def extend_1_month(callback: types.CallbackQuery):
+async def extend_1_month(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.split("_")[-1])
-    await extend_by_months(callback, order_id, 1)
+    await extend_by_months(callback, order_id, 1, session)
 
 
 @router.callback_query(F.data.startswith("extend_3_"))
-async def extend_3_months(callback: types.CallbackQuery):
+async def extend_3_months(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.split("_")[-1])
-    await extend_by_months(callback, order_id, 3)
+    await extend_by_months(callback, order_id, 3, session)
 
 
 @router.callback_query(F.data.startswith("extend_6_"))
-async def extend_6_months(callback: types.CallbackQuery):
+async def extend_6_months(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.split("_")[-1])
-    await extend_by_months(callback, order_id, 6)
+    await extend_by_months(callback, order_id, 6, session)
 
 
-async def extend_by_months(callback: types.CallbackQuery, order_id: int, months: int):
-    order = await get_order_by_id(order_id)
+async def extend_by_months(callback: types.CallbackQuery, order_id: int, months: int, session: AsyncSession):
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -446,12 +417,12 @@ async def extend_by_months(callback: types.CallbackQuery, order_id: int, months:
 
 
 @router.callback_query(F.data.startswith("confirm_extend_"))
-async def confirm_extend(callback: types.CallbackQuery):
+async def confirm_extend(callback: types.CallbackQuery, session: AsyncSession):
     parts = callback.data.split("_")
     order_id = int(parts[2])
     months = int(parts[3])
     
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -465,8 +436,10 @@ async def confirm_extend(callback: types.CallbackQuery):
     await update_order(
         order_id,
         end_date=new_end_date,
-        estimated_price=new_total_price
+        estimated_price=new_total_price,
+        session=session
     )
+    await session.commit()
     
     await callback.message.answer(
         f"Аренда продлена!\n\n"
@@ -491,9 +464,9 @@ async def cancel_extend(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("item_desc_"))
-async def item_description(callback: types.CallbackQuery):
+async def item_description(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("item_desc_", ""))
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -511,9 +484,9 @@ async def item_description(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("item_size_"))
-async def item_size(callback: types.CallbackQuery):
+async def item_size(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("item_size_", ""))
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -521,13 +494,13 @@ async def item_size(callback: types.CallbackQuery):
         return
 
     box_info = ""
-    for box in BOXES:
-        if box["name"] in order.volume:
+    for box in settings.current().boxes:
+        if box.name in order.volume:
             box_info = (
-                f"{box['name']}\n"
-                f"Размер: {box['size']}\n"
-                f"Габариты: {box['dimensions']}\n"
-                f"Цена: {box['price_per_month']} ₽/мес"
+                f"{box.name}\n"
+                f"Размер: {box.size}\n"
+                f"Габариты: {box.dimensions}\n"
+                f"Цена: {box.price_per_month} ₽/мес"
             )
             break
     
@@ -544,9 +517,9 @@ async def item_size(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("item_dates_"))
-async def item_dates(callback: types.CallbackQuery):
+async def item_dates(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("item_dates_", ""))
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -573,9 +546,9 @@ async def item_dates(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("item_payments_"))
-async def item_payments(callback: types.CallbackQuery):
+async def item_payments(callback: types.CallbackQuery, session: AsyncSession):
     order_id = int(callback.data.replace("item_payments_", ""))
-    order = await get_order_by_id(order_id)
+    order = await get_order_by_id(order_id, session)
     
     if not order:
         await callback.message.answer("Заказ не найден")
@@ -613,8 +586,8 @@ async def back_to_items(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data == "back_to_items_list")
-async def back_to_items_list(callback: types.CallbackQuery):
-    await my_items(callback.message)
+async def back_to_items_list(callback: types.CallbackQuery, session: AsyncSession):
+    await my_items(callback.message, session)
     await callback.answer()
 
 
@@ -652,18 +625,22 @@ async def storage_prepare(callback: types.CallbackQuery):
     await callback.answer()
 
 
+def _self_delivery_percent(delivery: settings.Delivery) -> int:
+    return round((1 - delivery.self_delivery_discount) * 100)
+
+
 @router.callback_query(F.data == "storage_delivery")
 async def storage_delivery(callback: types.CallbackQuery):
-    from config import WAREHOUSE_ADDRESS, DELIVERY_SETTINGS
+    config = settings.current()
     
     await callback.message.answer(
         f"Доставка и самовывоз\n\n"
         "Самовывоз:\n"
-        f"Адрес склада: {WAREHOUSE_ADDRESS}\n"
-        "Скидка за самовывоз: 20%\n\n"
+        f"Адрес склада: {config.warehouse_address}\n"
+        f"Скидка за самовывоз: {_self_delivery_percent(config.delivery)}%\n\n"
         "Доставка:\n"
-        f"Базовая стоимость: {DELIVERY_SETTINGS.get('pickup_service_base', 500)} ₽\n"
-        f"За 1 км: {DELIVERY_SETTINGS.get('pickup_per_km', 15)} ₽",
+        f"Базовая стоимость: {config.delivery.pickup_service_base} ₽\n"
+        f"За 1 км: {config.delivery.pickup_per_km} ₽",
         reply_markup=storage_info_kb()
     )
     await callback.answer()
@@ -688,22 +665,22 @@ async def storage_security(callback: types.CallbackQuery):
 
 @router.callback_query(F.data == "storage_rates")
 async def storage_rates(callback: types.CallbackQuery):
-    from config import BOXES, DELIVERY_SETTINGS
+    config = settings.current()
     
     text = "Тарифы и продление\n\n"
     
-    for box in BOXES:
+    for box in config.boxes:
         text += (
-            f"{box['name']}\n"
-            f"Размер: {box['size']}\n"
-            f"Цена: {box['price_per_month']} ₽/мес\n"
-            f"{box['description']}\n\n"
+            f"{box.name}\n"
+            f"Размер: {box.size}\n"
+            f"Цена: {box.price_per_month} ₽/мес\n"
+            f"{box.description}\n\n"
         )
     
     text += (
-        "Самовывоз: скидка 20%\n"
-        f"Доставка: {DELIVERY_SETTINGS.get('pickup_service_base', 500)} ₽ "
-        f"+ {DELIVERY_SETTINGS.get('pickup_per_km', 15)} ₽/км\n\n"
+        f"Самовывоз: скидка {_self_delivery_percent(config.delivery)}%\n"
+        f"Доставка: {config.delivery.pickup_service_base} ₽ "
+        f"+ {config.delivery.pickup_per_km} ₽/км\n\n"
         "Промокоды:\n"
         "Применяйте промокоды при оформлении заказа для получения скидки."
     )
@@ -717,8 +694,6 @@ async def storage_rates(callback: types.CallbackQuery):
 
 @router.callback_query(F.data == "request_call")
 async def request_call(callback: types.CallbackQuery):
-    from config import MANAGER_TG_ID
-    
     await callback.message.answer(
         "Заказать звонок\n\n"
         "Оставьте ваш номер телефона, и наш менеджер свяжется с вами в ближайшее время.\n\n"
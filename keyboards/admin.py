@@ -8,7 +8,47 @@ def admin_main_kb():
             [InlineKeyboardButton(text="Доставка", callback_data="admin_delivery")],
             [InlineKeyboardButton(text="Склад", callback_data="admin_storage")],
             [InlineKeyboardButton(text="Добавить промокод", callback_data="add_promo")],
+            [InlineKeyboardButton(text="Сгенерировать промокоды", callback_data="bulk_promo")],
             [InlineKeyboardButton(text="Список промокодов", callback_data="promo_stats")]
         ]
     )
-    return keyboard
\ No newline at end of file
+    return keyboard
+
+
+def admin_orders_page_kb(orders, has_prev: bool, has_next: bool):
+    buttons = [
+        [InlineKeyboardButton(text=f"✅ Принять на склад #{order.id}", callback_data=f"confirm_storage_{order.id}")]
+        for order in orders
+    ]
+
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton(text="⬅️ Новее", callback_data=f"orders_after_{orders[0].id}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton(text="Старее ➡️", callback_data=f"orders_before_{orders[-1].id}"))
+    if navigation:
+        buttons.append(navigation)
+
+    buttons.append([InlineKeyboardButton(text="Назад", callback_data="back_to_admin")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def admin_promo_page_kb(promos, has_prev: bool, has_next: bool):
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"{'Выключить' if promo.is_active else 'Включить'} {promo.code}",
+            callback_data=f"toggle_promo_{promo.code}"
+        )]
+        for promo in promos
+    ]
+
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton(text="⬅️ Новее", callback_data=f"promos_after_{promos[0].id}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton(text="Старее ➡️", callback_data=f"promos_before_{promos[-1].id}"))
+    if navigation:
+        buttons.append(navigation)
+
+    buttons.append([InlineKeyboardButton(text="Назад", callback_data="back_to_admin")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -4,7 +4,8 @@ from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton
 )
-from config import BOXES
+from functools import lru_cache
+from services import settings
 
 
 def generate_delivery_method_kb():
@@ -19,12 +20,18 @@ def generate_delivery_method_kb():
 
 
 def generate_boxes_kb():
+    return _boxes_kb(settings.current().boxes)
+
+
+# клавиатура собирается один раз на набор тарифов и пересобирается, когда config.json их меняет
+@lru_cache(maxsize=1)
+def _boxes_kb(boxes: tuple[settings.Box, ...]):
     buttons = []
-    for box in BOXES:
+    for box in boxes:
         buttons.append([
             InlineKeyboardButton(
-                text=f"{box['name']} - {box['price_per_month']} ₽",
-                callback_data=f"select_box_{box['id']}"
+                text=f"{box.name} - {box.price_per_month} ₽",
+                callback_data=f"select_box_{box.id}"
             )
         ])
     
@@ -1,5 +1,5 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-from config import MANAGER_TG_ID
+from services import settings
 
 
 def main_menu_kb(user_id: int):
@@ -14,7 +14,7 @@ def main_menu_kb(user_id: int):
             KeyboardButton(text="Арендовать бокс")
         ],
     ]
-    if user_id in MANAGER_TG_ID:
+    if user_id in settings.current().manager_tg_ids:
         keyboard.append([KeyboardButton(text="Админ-панель")])
 
     return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
\ No newline at end of file
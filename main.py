@@ -1,59 +1,91 @@
 import asyncio
-from decouple import config
+from decouple import config, Choices
 from aiogram import Bot, Dispatcher
 from handlers import register_routes
-from database.init_db import init_db
+from middlewares.db import DbSessionMiddleware
+from middlewares.scheduler import ChatSchedulerMiddleware
+from services.fsm_storage import SqliteStorage
+from database.init_db import init_db, seed_promos
+from services import mailer, outbox, settings, webhook
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 
 TG_TOKEN = config('TELEGRAM_TOKEN')
+# polling — один цикл getUpdates; webhook — приём через aiohttp-сервер, см. services/webhook.py
+BOT_MODE = config('BOT_MODE', default='polling', cast=Choices(['polling', 'webhook']))
 scheduler = AsyncIOScheduler()
 
 
 async def run_daily_checks():
     from database.repository import (
-        check_and_notify_expiring_orders, 
-        mark_and_notify_expired_orders,
-        mark_expired_orders_auto,
-        check_and_notify_overdue_orders
+        send_due_reminders,
+        expire_overdue_orders,
+        dispose_abandoned_orders
     )
     
     print("Запуск проверки заказов...")
+    mailer.pool.start_run()
     
     try:
-        await check_and_notify_expiring_orders()
-        print("Напоминания об истекающих заказах отправлены")
+        reminders_count = await send_due_reminders()
+        print(f"Напоминаний поставлено в очередь: {reminders_count}")
     except Exception as e:
         print(f"Ошибка при отправке напоминаний: {e}")
 
     try:
-        await mark_expired_orders_auto()
-        print("Просроченные заказы помечены")
-    except Exception as e:
-        print(f"Ошибка при пометке просроченных заказов: {e}")
-
-    try:
-        expired_count = await mark_and_notify_expired_orders()
+        expired_count = await expire_overdue_orders()
         if expired_count > 0:
             print(f"Обработано просроченных заказов: {expired_count}")
     except Exception as e:
         print(f"Ошибка при обработке просроченных заказов: {e}")
 
     try:
-        await check_and_notify_overdue_orders()
-        print("Уведомления о просроченных заказах отправлены")
+        disposed_count = await dispose_abandoned_orders()
+        if disposed_count > 0:
+            print(f"🗑️ Помечено утилизированных заказов: {disposed_count}")
+    except Exception as e:
+        print(f"Ошибка при утилизации заказов: {e}")
+
+    try:
+        await outbox.drain()
     except Exception as e:
-        print(f"Ошибка при отправке уведомлений о просрочке: {e}")
+        print(f"Ошибка при отправке писем из очереди: {e}")
+
+    await mailer.close_idle()
+    stats = mailer.pool.run_stats()
+    print(
+        f"Писем отправлено: {stats['sent']}, ошибок: {stats['failed']} "
+        f"({stats['per_second']:.1f} писем/с за {stats['seconds']:.1f} с)"
+    )
     
     print("Ежедневная проверка завершена")
 
 
+def log_update_stats(update_scheduler: ChatSchedulerMiddleware):
+    stats = update_scheduler.stats()
+    if not stats["handled"]:
+        return
+    print(
+        f"Апдейтов обработано: {stats['handled']}, в работе: {stats['running']}, ждут: {stats['waiting']} "
+        f"(чатов в очереди: {stats['chats']}, самая длинная очередь: {stats['deepest_chat']}); "
+        f"ожидание p50 {stats['wait_p50_ms']:.0f} мс, p95 {stats['wait_p95_ms']:.0f} мс, "
+        f"максимум {stats['wait_max_ms']:.0f} мс"
+    )
+
+
 async def main():
     bot = Bot(token=TG_TOKEN)
-    dp = Dispatcher()
+    # незавершённые диалоги переживают перезапуск: хранилище сохраняет их в базу при остановке
+    dp = Dispatcher(storage=SqliteStorage())
 
     await init_db()
 
+    dispatcher_task = asyncio.create_task(outbox.run_dispatcher())
+
+    # новые промокоды из config.json заводятся без перезапуска, как и остальные настройки
+    settings.on_reload(seed_promos)
+    settings_task = asyncio.create_task(settings.watch())
+
     scheduler.add_job(
         run_daily_checks,
         trigger='cron',
@@ -65,9 +97,29 @@ async def main():
     print("Планировщик запущен (проверка каждый день в 9:00)")
 
 
+    # апдейты одного чата — по очереди, разных — параллельно; ждут очереди до того, как взять сессию БД
+    update_scheduler = ChatSchedulerMiddleware()
+    dp.update.outer_middleware(update_scheduler)
+    dp.update.outer_middleware(DbSessionMiddleware())
+    scheduler.add_job(
+        log_update_stats,
+        trigger='interval',
+        minutes=10,
+        args=[update_scheduler],
+        id='update_stats'
+    )
     register_routes(dp)
 
-    await dp.start_polling(bot)
+    try:
+        if BOT_MODE == "webhook":
+            await webhook.run_webhook(dp, bot)
+        else:
+            # после работы через вебхук getUpdates не отдаст апдейты, пока вебхук не снят
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        dispatcher_task.cancel()
+        settings_task.cancel()
 
 
 if __name__ == '__main__':
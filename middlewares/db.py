@@ -0,0 +1,26 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from database.session import async_session
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Одна сессия БД на каждый апдейт Telegram, коммит — в конце обработки.
+
+    Первая запись берёт блокировку записи SQLite до коммита, поэтому обработчик,
+    который пишет, коммитит сам до ответа в Telegram: иначе остальные апдейты
+    ждали бы блокировку, пока идут сетевые вызовы.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        # соединение берётся из пула только при первом запросе к БД
+        async with async_session() as session:
+            data["session"] = session
+            result = await handler(event, data)
+            await session.commit()
+            return result
@@ -0,0 +1,87 @@
+import asyncio
+import statistics
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Dict
+from decouple import config
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+# сколько апдейтов обрабатывается одновременно во всех чатах вместе
+UPDATE_CONCURRENCY = config('UPDATE_CONCURRENCY', default=64, cast=int)
+# по скольким последним апдейтам считаются перцентили ожидания
+UPDATE_WAIT_SAMPLES = 1000
+
+
+class _Chat:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # отпускает ждущих в порядке прихода
+        self.depth = 0  # апдейты чата в работе и в очереди
+
+
+class ChatSchedulerMiddleware(BaseMiddleware):
+    """Апдейты одного чата — строго по очереди, разных чатов — параллельно, но не больше concurrency сразу"""
+
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY):
+        self._slots = asyncio.Semaphore(concurrency)
+        self._chats: dict[int, _Chat] = {}
+        self._waiting = 0
+        self._running = 0
+        self._handled = 0
+        self._waits: deque[float] = deque(maxlen=UPDATE_WAIT_SAMPLES)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        context = data.get("event_context")
+        key = context and (context.chat_id or context.user_id)
+        chat = None
+        if key is not None:
+            chat = self._chats.get(key)
+            if chat is None:
+                chat = self._chats[key] = _Chat()
+            chat.depth += 1
+
+        arrived = time.perf_counter()
+        self._waiting += 1
+        started = False
+        try:
+            # сначала очередь чата, потом общий слот: ждущий своей очереди чат не занимает слот;
+            # апдейту без чата и пользователя (опросы и т.п.) очередь не нужна
+            async with chat.lock if chat else nullcontext(), self._slots:
+                started = True
+                self._waiting -= 1
+                self._waits.append(time.perf_counter() - arrived)
+                self._running += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self._running -= 1
+                    self._handled += 1
+        finally:
+            if not started:
+                self._waiting -= 1
+            if chat is not None:
+                chat.depth -= 1
+                if not chat.depth:
+                    del self._chats[key]
+
+    def stats(self) -> dict:
+        """Глубина очередей и время ожидания до начала обработки (по последним апдейтам)"""
+        waits = sorted(self._waits)
+        return {
+            "running": self._running,
+            "waiting": self._waiting,
+            "chats": len(self._chats),
+            "deepest_chat": max((chat.depth for chat in self._chats.values()), default=0),
+            "handled": self._handled,
+            "wait_p50_ms": statistics.median(waits) * 1000 if waits else 0.0,
+            "wait_p95_ms": waits[int(len(waits) * 0.95) - 1] * 1000 if waits else 0.0,
+            "wait_max_ms": waits[-1] * 1000 if waits else 0.0,
+        }
@@ -0,0 +1,67 @@
+from collections import deque
+from typing import Hashable, Iterable, Iterator, Sequence
+
+
+class AhoCorasick:
+    """Автомат Ахо–Корасик: все вхождения всех шаблонов за один проход по входу.
+
+    Символами могут быть любые хешируемые значения — буквы строки или,
+    например, основы слов. К каждому шаблону привязывается произвольное значение.
+    """
+
+    def __init__(self):
+        self._goto: list[dict[Hashable, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list] = [[]]
+        self._built = False
+
+    def add(self, pattern: Sequence[Hashable], value):
+        if not pattern:
+            return
+
+        state = 0
+        for symbol in pattern:
+            next_state = self._goto[state].get(symbol)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][symbol] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+
+        self._out[state].append(value)
+        self._built = False
+
+    def build(self):
+        """Суффиксные ссылки обходом в ширину; выходы наследуются по ним"""
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+
+        while queue:
+            state = queue.popleft()
+            for symbol, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and symbol not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(symbol, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+        self._built = True
+
+    def search(self, symbols: Iterable[Hashable]) -> Iterator[tuple[int, object]]:
+        """Пары (индекс последнего символа вхождения, значение шаблона)"""
+        if not self._built:
+            self.build()
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for index, symbol in enumerate(symbols):
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            for value in out[state]:
+                yield index, value
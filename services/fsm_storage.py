@@ -0,0 +1,205 @@
+"""Хранилище состояний FSM: активные диалоги в памяти, запись в SQLite пачками, брошенные диалоги удаляются по TTL"""
+import asyncio
+import datetime
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Mapping
+from decouple import config
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from database.repository import load_fsm_record, save_fsm_records, purge_fsm_records
+
+# сколько диалогов держать в памяти; несохранённые не вытесняются до ближайшей записи
+FSM_CACHE_SIZE = config('FSM_CACHE_SIZE', default=10000, cast=int)
+# как часто сбрасывать изменения в базу и сколько изменений ждать до внеочередной записи
+FSM_FLUSH_INTERVAL = config('FSM_FLUSH_INTERVAL', default=1.0, cast=float)
+FSM_FLUSH_BATCH = config('FSM_FLUSH_BATCH', default=500, cast=int)
+# диалог без изменений дольше этого (в часах) считается брошенным и удаляется
+FSM_STATE_TTL_HOURS = config('FSM_STATE_TTL_HOURS', default=72, cast=float)
+FSM_PURGE_INTERVAL = 600
+
+
+class _Record:
+    __slots__ = ("state", "data", "payload", "updated_at")
+
+    def __init__(self, state: str | None, payload: str, updated_at: datetime.datetime):
+        self.state = state
+        self.payload = payload  # data в JSON: проверено при записи и готово к сохранению
+        self.data = json.loads(payload)
+        self.updated_at = updated_at
+
+    @property
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SqliteStorage(BaseStorage):
+    def __init__(
+        self,
+        cache_size: int = FSM_CACHE_SIZE,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        flush_batch: int = FSM_FLUSH_BATCH,
+        ttl: datetime.timedelta = datetime.timedelta(hours=FSM_STATE_TTL_HOURS),
+    ):
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self._cache_size = cache_size
+        self._flush_interval = flush_interval
+        self._flush_batch = flush_batch
+        self._ttl = ttl
+
+        self._records: OrderedDict[str, _Record] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._flushing: set[str] = set()  # записываются прямо сейчас — вытеснять нельзя
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: asyncio.Task | None = None
+        self._purged_at = 0.0
+
+    def _expired(self, updated_at: datetime.datetime) -> bool:
+        return updated_at < datetime.datetime.now() - self._ttl
+
+    async def _record(self, key: StorageKey) -> tuple[str, _Record]:
+        name = self._key_builder.build(key)
+        record = self._records.get(name)
+
+        if record is None:
+            row = await load_fsm_record(name)
+            # пока ждали базу, этот же ключ мог записать другой апдейт — его версия новее
+            record = self._records.get(name)
+            if record is None:
+                if row is None or self._expired(row.updated_at):
+                    record = _Record(None, "{}", datetime.datetime.now())
+                else:
+                    record = _Record(row.state, row.data, row.updated_at)
+                self._records[name] = record
+        elif not record.is_empty and self._expired(record.updated_at):
+            # диалог бросили: начинаем с чистого листа, а строку в базе удалит ближайшая запись
+            record.state, record.payload, record.data = None, "{}", {}
+            self._mark_dirty(name, record)
+
+        self._records.move_to_end(name)
+        self._start_flusher()
+        self._trim(keep=name)
+        return name, record
+
+    def _mark_dirty(self, name: str, record: _Record):
+        record.updated_at = datetime.datetime.now()
+        self._dirty.add(name)
+        if len(self._dirty) >= self._flush_batch:
+            self._wakeup.set()
+
+    def _trim(self, keep: str | None = None):
+        """Вытесняет самые давние сохранённые диалоги, пока кэш больше лимита"""
+        excess = len(self._records) - self._cache_size
+        if excess <= 0:
+            return
+        # идём от самых давних и останавливаемся, как только набрали сколько нужно:
+        # пропускать приходится только несохранённые, а их не больше пачки записи
+        evicted = []
+        for name in self._records:
+            if name != keep and name not in self._dirty and name not in self._flushing:
+                evicted.append(name)
+                if len(evicted) == excess:
+                    break
+        for name in evicted:
+            del self._records[name]
+        if len(self._records) > self._cache_size:
+            # всё лишнее ещё не сохранено — записываем, не дожидаясь интервала
+            self._wakeup.set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        name, record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(name, record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        _, record = await self._record(key)
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        # несериализуемое значение должно упасть в обработчике, а не при фоновой записи
+        payload = json.dumps(data, ensure_ascii=False)
+        name, record = await self._record(key)
+        record.payload = payload
+        record.data = data.copy()
+        self._mark_dirty(name, record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, record = await self._record(key)
+        return record.data.copy()
+
+    async def flush(self):
+        """Записывает в базу все изменённые с прошлой записи диалоги"""
+        async with self._flush_lock:
+            names = list(self._dirty)
+            if not names:
+                return
+            self._dirty.clear()
+            self._flushing.update(names)
+
+            records, deleted_keys = [], []
+            for name in names:
+                record = self._records[name]
+                if record.is_empty:
+                    deleted_keys.append(name)
+                else:
+                    records.append({
+                        "key": name,
+                        "state": record.state,
+                        "data": record.payload,
+                        "updated_at": record.updated_at
+                    })
+
+            try:
+                await save_fsm_records(records, deleted_keys)
+            except Exception:
+                # то, что успели поменять во время записи, уже снова в _dirty
+                self._dirty.update(names)
+                raise
+            finally:
+                self._flushing.clear()
+        self._trim()
+
+    async def purge(self) -> int:
+        """Удаляет брошенные диалоги из памяти и из базы"""
+        cutoff = datetime.datetime.now() - self._ttl
+        for name in [
+            name for name, record in self._records.items()
+            if record.updated_at < cutoff and name not in self._dirty
+        ]:
+            del self._records[name]
+        return await purge_fsm_records(cutoff)
+
+    def _start_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+                if time.monotonic() - self._purged_at >= FSM_PURGE_INTERVAL:
+                    self._purged_at = time.monotonic()
+                    purged = await self.purge()
+                    if purged:
+                        print(f"Удалено брошенных диалогов: {purged}")
+            except Exception as e:
+                print(f"Ошибка при сохранении состояний диалогов: {e}")
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
@@ -0,0 +1,80 @@
+from collections import Counter, defaultdict
+from itertools import chain
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна, если оно не больше limit, иначе limit + 1.
+
+    Считается только полоса |i - j| <= limit: клетки за её пределами заведомо больше limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    over = limit + 1
+    previous = [i if i <= limit else over for i in range(len(a) + 1)]
+    for j in range(1, len(b) + 1):
+        char_b = b[j - 1]
+        low, high = max(1, j - limit), min(len(a), j + limit)
+        current = [over] * (len(a) + 1)
+        if j <= limit:
+            current[0] = j
+        for i in range(low, high + 1):
+            cost = previous[i - 1] + (a[i - 1] != char_b)
+            if previous[i] + 1 < cost:
+                cost = previous[i] + 1
+            if current[i - 1] + 1 < cost:
+                cost = current[i - 1] + 1
+            current[i] = cost if cost < over else over
+        if min(current[low - 1:high + 1]) >= over:
+            return over
+        previous = current
+
+    return previous[-1]
+
+
+def trigrams(word: str) -> set[str]:
+    # одинарные метки краёв: двойные дают триграммы вида «^^а», общие для слишком многих слов
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Нечёткий поиск слов в радиусе n правок по триграммному индексу.
+
+    Одна правка задевает не больше трёх триграмм слова, поэтому у слова
+    на расстоянии n с запросом общих триграмм не меньше len(Q) - 3n.
+    Расстояние Левенштейна считается только для прошедших этот фильтр.
+    """
+
+    def __init__(self):
+        self._words: list[tuple[str, object]] = []
+        self._postings: dict[str, list[int]] = defaultdict(list)
+
+    def add(self, word: str, value):
+        index = len(self._words)
+        self._words.append((word, value))
+        for trigram in trigrams(word):
+            self._postings[trigram].append(index)
+
+    def search(self, word: str, radius: int) -> list[tuple[int, object]]:
+        """Пары (расстояние, значение) для слов не дальше radius, ближайшие первыми"""
+        query = trigrams(word)
+        threshold = max(1, len(query) - 3 * radius)
+
+        shared = Counter(chain.from_iterable(
+            self._postings[trigram] for trigram in query if trigram in self._postings
+        ))
+
+        found = []
+        for index, count in shared.items():
+            if count < threshold:
+                continue
+            candidate, value = self._words[index]
+            distance = bounded_levenshtein(word, candidate, radius)
+            if distance <= radius:
+                found.append((distance, value))
+
+        found.sort(key=lambda item: item[0])
+        return found
@@ -0,0 +1,216 @@
+import re
+from typing import NamedTuple
+
+from services import settings
+from services.automaton import AhoCorasick
+from services.fuzzy import TrigramIndex
+from services.morphology import stem, stems, tokenize, without_fleeting_vowel
+
+DEFAULT_REASON = "запрещено по правилам безопасности"
+
+# основы короче этого сравниваются только целиком: «яд» не должен находиться в «ядре»
+MIN_PREFIX_STEM = 4
+
+# сложные слова: запрещённая основа, соединительная гласная и вторая часть с гласной
+# от 3 букв — «лак-о-красочные», «яд-о-химикаты», но не «ядро» и не «лак-о-мство»
+COMPOUND_VOWELS = "ое"
+COMPOUND_MIN_TAIL = 3
+_VOWEL = re.compile(r"[аеиоуыэюя]")
+
+# опечатки ищем только в словах от 4 букв; в длинных допускаем две правки
+FUZZY_MIN_LENGTH = 4
+FUZZY_LONG_WORD = 7
+
+# вещи в списке разделяют запятыми, точкой с запятой и переводами строк
+_ITEM_SEPARATORS = re.compile(r"[,;\n]+")
+# количество в начале («20 коробок», «2 шт. стула») или в конце («стул x2», «стул 2 шт»)
+_QUANTITY = re.compile(
+    r"^\s*\d+\s*(шт\.?|штук\w*)?(\s+|$)|\s+[xх×]?\s*\d+\s*(шт\.?|штук\w*)?\s*$",
+    re.IGNORECASE
+)
+
+# сколько разных слов из сообщений помнить вместе с найденными для них символами
+TOKEN_CACHE_SIZE = 65536
+
+
+class Verdict(NamedTuple):
+    status: str  # prohibited / allowed / unknown
+    keyword: str | None = None
+    reason: str | None = None
+    guess: bool = False  # keyword — похожее по написанию слово, а не совпадение; статус всегда unknown
+
+
+def split_items(text: str) -> list[tuple[str, str]]:
+    """Вещи из списка: как их написал клиент и название без количества"""
+    items = []
+    for part in _ITEM_SEPARATORS.split(text):
+        item = part.strip(" .-—\t")
+        name = _QUANTITY.sub("", item).strip(" .-—\t")
+        if name:
+            items.append((item, name))
+    return items
+
+
+class ItemChecker:
+    """Классификатор вещей: оба списка ключевых слов в одном автомате над основами слов"""
+
+    def __init__(self, prohibited: list[str], allowed: list[str], reasons: dict[str, str]):
+        # основа ключевого слова -> номер символа автомата
+        self._symbols: dict[str, int] = {}
+        # символ однословного ключевого слова -> лучший вердикт для нечёткого поиска
+        self._single_word: dict[int, tuple] = {}
+        self._automaton = AhoCorasick()
+        # приоритет: запрещённое важнее разрешённого, внутри списка — порядок в config.json
+        for priority, keyword in enumerate(prohibited):
+            reason = reasons.get(keyword, DEFAULT_REASON)
+            self._add(keyword, (0, priority, Verdict("prohibited", keyword, reason)))
+        for priority, keyword in enumerate(allowed):
+            self._add(keyword, (1, priority, Verdict("allowed", keyword)))
+        self._automaton.build()
+        # начало сложного слова — только запрещённые ключевые слова, записанные в config.json
+        # основой («лак», «яд», «хлор»): основа «жив» от «живые» нашлась бы и в «живописи»
+        self._compound_heads = {
+            token: self._symbols[token]
+            for keyword in prohibited
+            for token in tokenize(keyword)
+            if len(tokenize(keyword)) == 1 and stem(token) == token
+        }
+        self._token_cache: dict[str, int | None] = {}
+        self._fuzzy_cache: dict[str, list[tuple[int, int]]] = {}
+
+        self._fuzzy = TrigramIndex()
+        for word_stem, symbol in self._symbols.items():
+            if symbol in self._single_word and len(word_stem) >= FUZZY_MIN_LENGTH:
+                self._fuzzy.add(word_stem, symbol)
+
+    def _add(self, keyword: str, value):
+        pattern = []
+        for token in tokenize(keyword):
+            symbol = self._symbols.setdefault(stem(token), len(self._symbols))
+            # исходное слово тоже работает как префикс: «мото» после стемминга слишком короткое
+            self._symbols.setdefault(token, symbol)
+            pattern.append(symbol)
+        self._automaton.add(pattern, value)
+
+        if len(pattern) == 1 and value[:2] < self._single_word.get(pattern[0], (2,)):
+            self._single_word[pattern[0]] = value
+
+    def _lookup(self, word_stem: str) -> int | None:
+        symbol = self._symbols.get(word_stem)
+        if symbol is not None:
+            return symbol
+
+        # ручные основы вроде «взрывчат» и «ядовит»: самая длинная основа-префикс слова
+        for length in range(len(word_stem) - 1, MIN_PREFIX_STEM - 1, -1):
+            prefix = word_stem[:length]
+            if len(prefix) >= MIN_PREFIX_STEM and prefix in self._symbols:
+                return self._symbols[prefix]
+        return self._compound(word_stem)
+
+    def _compound(self, word_stem: str) -> int | None:
+        """Символ запрещённой основы, с которой начинается сложное слово, или None"""
+        for length in range(len(word_stem) - COMPOUND_MIN_TAIL - 1, 1, -1):
+            if word_stem[length] not in COMPOUND_VOWELS:
+                continue
+            tail = word_stem[length + 1:]
+            head = self._compound_heads.get(word_stem[:length])
+            if head is not None and _VOWEL.search(tail):
+                return head
+        return None
+
+    def symbol(self, word_stem: str) -> int | None:
+        """Символ автомата для основы слова из сообщения или None"""
+        if word_stem in self._token_cache:
+            return self._token_cache[word_stem]
+
+        symbol = self._lookup(word_stem)
+        if symbol is None and (alternative := without_fleeting_vowel(word_stem)):
+            symbol = self._lookup(alternative)
+
+        if len(self._token_cache) < TOKEN_CACHE_SIZE:
+            self._token_cache[word_stem] = symbol
+        return symbol
+
+    def _similar(self, word_stem: str) -> list[tuple[int, int]]:
+        """(расстояние, символ) для похожих ключевых слов; опечатки повторяются, поэтому с кэшем"""
+        if word_stem in self._fuzzy_cache:
+            return self._fuzzy_cache[word_stem]
+
+        radius = 2 if len(word_stem) >= FUZZY_LONG_WORD else 1
+        similar = self._fuzzy.search(word_stem, radius)
+
+        if len(self._fuzzy_cache) < TOKEN_CACHE_SIZE:
+            self._fuzzy_cache[word_stem] = similar
+        return similar
+
+    def _guess(self, word_stems: list[str]) -> Verdict:
+        """Ближайшее по написанию ключевое слово, когда точный поиск ничего не дал"""
+        candidates = []
+        for word_stem in word_stems:
+            if len(word_stem) < FUZZY_MIN_LENGTH:
+                continue
+            for distance, symbol in self._similar(word_stem):
+                candidates.append((distance, *self._single_word[symbol]))
+
+        if not candidates:
+            return Verdict("unknown")
+
+        # похожее написание — только подсказка: «живопись» похожа на «живот», но запрещать её нельзя
+        verdict = min(candidates, key=lambda candidate: candidate[:3])[3]
+        return Verdict("unknown", verdict.keyword, guess=True)
+
+    def classify(self, text: str) -> Verdict:
+        word_stems = stems(text)
+        best = min(
+            (value for _, value in self._automaton.search(map(self.symbol, word_stems))),
+            default=None,
+            key=lambda value: value[:2]
+        )
+        return best[2] if best else self._guess(word_stems)
+
+    def classify_items(self, text: str) -> list[tuple[str, Verdict]]:
+        """Вердикт для каждой вещи из списка за один проход автомата по всему сообщению"""
+        items = split_items(text)
+        item_stems = [stems(name) for _, name in items]
+
+        # None между вещами сбрасывает автомат, поэтому совпадение не перескочит через запятую
+        symbols, owners = [], []
+        for index, word_stems in enumerate(item_stems):
+            symbols.extend(map(self.symbol, word_stems))
+            owners.extend([index] * len(word_stems))
+            symbols.append(None)
+            owners.append(None)
+
+        best = [None] * len(items)
+        for end, value in self._automaton.search(symbols):
+            index = owners[end]
+            if best[index] is None or value[:2] < best[index][:2]:
+                best[index] = value
+
+        return [
+            (item, value[2] if value else self._guess(word_stems))
+            for (item, _), word_stems, value in zip(items, item_stems, best)
+        ]
+
+
+def _build(config: settings.Settings) -> ItemChecker:
+    return ItemChecker(config.prohibited_keywords, config.allowed_keywords, config.prohibited_reasons)
+
+
+def _keywords(config: settings.Settings):
+    return config.prohibited_keywords, config.allowed_keywords, dict(config.prohibited_reasons)
+
+
+# обращаться как item_checker.checker: при смене ключевых слов в config.json объект подменяется целиком
+checker = _build(settings.current())
+_checker_keywords = _keywords(settings.current())
+
+
+@settings.on_reload
+def _rebuild(config: settings.Settings):
+    global checker, _checker_keywords
+    if _keywords(config) == _checker_keywords:
+        return
+    checker = _build(config)
+    _checker_keywords = _keywords(config)
+    print(f"Ключевые слова обновлены: запрещённых {len(config.prohibited_keywords)}, разрешённых {len(config.allowed_keywords)}")
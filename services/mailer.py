@@ -0,0 +1,163 @@
+import asyncio
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
+
+
+SMTP_HOST = config('SMTP_HOST', default='smtp.gmail.com')
+SMTP_PORT = config('SMTP_PORT', default=465, cast=int)
+SMTP_TIMEOUT = config('SMTP_TIMEOUT', default=30, cast=int)
+SMTP_MAX_CONCURRENCY = config('SMTP_MAX_CONCURRENCY', default=4, cast=int)
+SMTP_IDLE_TIMEOUT = config('SMTP_IDLE_TIMEOUT', default=60, cast=int)
+
+# smtplib блокирующий: письма уходят из отдельного пула потоков,
+# размер пула ограничивает число одновременных SMTP-соединений
+_executor = ThreadPoolExecutor(
+    max_workers=SMTP_MAX_CONCURRENCY,
+    thread_name_prefix="smtp"
+)
+
+# ошибки, после которых соединение ещё живо: письмо отклонено, а не сессия
+_MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+
+def get_credentials():
+    return config('EMAIL', default=''), config('APP_PASSWORD', default='')
+
+
+def build_letter(sender_email: str, email: str, subject: str, message: str) -> bytes:
+    letter = f"""From: {sender_email}
+To: {email}
+Subject: {subject}
+Content-Type: text/plain; charset="UTF-8";
+
+{message}"""
+
+    return letter.encode("UTF-8")
+
+
+class SmtpPool:
+    """Пул авторизованных SMTP-сессий, переиспользуемых между письмами."""
+
+    def __init__(self, idle_timeout: int = SMTP_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.start_run()
+
+    def _connect(self, sender_email: str, app_password: str):
+        context = ssl.create_default_context()
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context, timeout=SMTP_TIMEOUT)
+        try:
+            server.login(sender_email, app_password)
+        except Exception:
+            self._close(server)
+            raise
+
+        with self._lock:
+            self.connects += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _acquire(self, sender_email: str, app_password: str):
+        while True:
+            try:
+                server, login, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect(sender_email, app_password)
+
+            # сервер сам рвёт простаивающие сессии, такие не берём
+            if login != sender_email or time.monotonic() - released_at > self.idle_timeout:
+                self._close(server)
+                continue
+            return server
+
+    def _release(self, server, sender_email: str):
+        self._idle.put((server, sender_email, time.monotonic()))
+
+    def send(self, sender_email: str, app_password: str, email: str, letter: bytes):
+        try:
+            self._send(sender_email, app_password, email, letter)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+
+        with self._lock:
+            self.sent += 1
+
+    def _send(self, sender_email: str, app_password: str, email: str, letter: bytes):
+        server = self._acquire(sender_email, app_password)
+        try:
+            server.sendmail(sender_email, email, letter)
+        except _MESSAGE_ERRORS:
+            self._release(server, sender_email)
+            raise
+        except (smtplib.SMTPException, OSError):
+            # сессия умерла: одна попытка на свежем соединении
+            self._close(server)
+            server = self._connect(sender_email, app_password)
+            try:
+                server.sendmail(sender_email, email, letter)
+            except _MESSAGE_ERRORS:
+                self._release(server, sender_email)
+                raise
+            except Exception:
+                self._close(server)
+                raise
+
+        self._release(server, sender_email)
+
+    def close_idle(self):
+        while True:
+            try:
+                server, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+    def start_run(self):
+        with self._lock:
+            self.sent = 0
+            self.failed = 0
+            self.run_started = time.monotonic()
+
+    def run_stats(self) -> dict:
+        with self._lock:
+            elapsed = time.monotonic() - self.run_started
+            return {
+                "sent": self.sent,
+                "failed": self.failed,
+                "seconds": elapsed,
+                "per_second": self.sent / elapsed if elapsed > 0 else 0.0,
+            }
+
+
+pool = SmtpPool()
+
+
+async def deliver(sender_email: str, app_password: str, email: str, letter: bytes):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        _executor, pool.send, sender_email, app_password, email, letter
+    )
+
+
+async def close_idle():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_executor, pool.close_idle)
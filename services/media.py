@@ -0,0 +1,70 @@
+"""Файлы, которые бот отправляет многим пользователям: загрузка в Telegram один раз, дальше — по file_id"""
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import BASE_DIR
+from database.repository import get_media_file_id, save_media_file_id, forget_media_file_id
+
+# путь -> ((mtime_ns, size), sha256): пока файл не трогали, хэш не пересчитывается
+_hashes: dict[str, tuple[tuple[int, int], str]] = {}
+# (путь, sha256) -> file_id, чтобы /start не ходил даже в базу
+_file_ids: dict[tuple[str, str], str] = {}
+
+
+def _key(path: Path) -> str:
+    path = Path(path).resolve()
+    try:
+        return str(path.relative_to(BASE_DIR))
+    except ValueError:
+        return str(path)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def content_hash(path: Path) -> str:
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _hashes.get(str(path))
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    digest = await asyncio.to_thread(_sha256, path)
+    _hashes[str(path)] = (stamp, digest)
+    return digest
+
+
+async def answer_document(message: Message, path: Path, session: AsyncSession | None = None, **kwargs) -> Message:
+    """Отправляет файл в чат message; загружает его в Telegram, только если такого содержимого там ещё нет.
+
+    session нужна только для чтения: file_id записывается отдельной короткой транзакцией,
+    чтобы транзакция апдейта не держала блокировку записи, пока идёт загрузка файла.
+    """
+    key = (_key(path), await content_hash(path))
+
+    file_id = _file_ids.get(key) or await get_media_file_id(*key, session)
+    if file_id:
+        try:
+            sent = await message.answer_document(document=file_id, **kwargs)
+            _file_ids[key] = file_id
+            return sent
+        except TelegramBadRequest:
+            # file_id выдан другому боту или удалён — загружаем заново
+            _file_ids.pop(key, None)
+            await forget_media_file_id(*key)
+
+    sent = await message.answer_document(document=FSInputFile(path), **kwargs)
+    if sent.document:
+        _file_ids[key] = sent.document.file_id
+        await save_media_file_id(*key, sent.document.file_id)
+    return sent
@@ -0,0 +1,86 @@
+import re
+from functools import lru_cache
+
+# Нормализация для поиска по словам: токены в нижнем регистре, ё → е,
+# основы по алгоритму Snowball для русского языка
+
+_TOKEN = re.compile(r"[a-zа-я0-9]+")
+
+_VOWELS = "аеиоуыэюя"
+_RV = re.compile(rf"^(.*?[{_VOWELS}])(.*)$")
+_PERFECTIVE_GERUND = re.compile(r"((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$")
+_REFLEXIVE = re.compile(r"(с[яь])$")
+_ADJECTIVE = re.compile(
+    r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$"
+)
+_PARTICIPLE = re.compile(r"((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$")
+_VERB = re.compile(
+    r"((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)"
+    r"|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$"
+)
+_NOUN = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$"
+)
+_I = re.compile(r"и$")
+_SOFT_SIGN = re.compile(r"ь$")
+_DOUBLE_N = re.compile(r"нн$")
+_SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+# окончание ость/ост снимается только в R2: после гласной, согласной и ещё одной гласной
+_DERIVATIONAL_R2 = re.compile(rf".*[^{_VOWELS}]+[{_VOWELS}].*ость?$")
+_DERIVATIONAL = re.compile(r"ость?$")
+# беглая гласная: коробок / коробка, замок / замка
+_FLEETING_VOWEL = re.compile(rf"[ое]([^{_VOWELS}])$")
+
+
+def normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(normalize(text))
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    match = _RV.match(word)
+    if not match:
+        return word
+
+    prefix, rv = match.groups()
+
+    stripped = _PERFECTIVE_GERUND.sub("", rv, 1)
+    if stripped == rv:
+        rv = _REFLEXIVE.sub("", rv, 1)
+        stripped = _ADJECTIVE.sub("", rv, 1)
+        if stripped != rv:
+            rv = _PARTICIPLE.sub("", stripped, 1)
+        else:
+            stripped = _VERB.sub("", rv, 1)
+            rv = _NOUN.sub("", rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    rv = _I.sub("", rv, 1)
+
+    if _DERIVATIONAL_R2.match(rv):
+        rv = _DERIVATIONAL.sub("", rv, 1)
+
+    stripped = _SOFT_SIGN.sub("", rv, 1)
+    if stripped == rv:
+        rv = _SUPERLATIVE.sub("", rv, 1)
+        rv = _DOUBLE_N.sub("н", rv, 1)
+    else:
+        rv = stripped
+
+    return prefix + rv
+
+
+def stems(text: str) -> list[str]:
+    return [stem(token) for token in tokenize(text)]
+
+
+def without_fleeting_vowel(word_stem: str) -> str | None:
+    """Основа без беглой гласной перед последней согласной или None"""
+    if _FLEETING_VOWEL.search(word_stem):
+        return word_stem[:-2] + word_stem[-1]
+    return None
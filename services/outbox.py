@@ -0,0 +1,94 @@
+import asyncio
+import datetime
+import smtplib
+from decouple import config
+from sqlalchemy import select, update
+from database.models import OutboxEmail
+from database.session import async_session
+from services import mailer
+
+
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=50, cast=int)
+OUTBOX_POLL_INTERVAL = config('OUTBOX_POLL_INTERVAL', default=5, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_BACKOFF_BASE = config('OUTBOX_BACKOFF_BASE', default=30, cast=int)
+OUTBOX_BACKOFF_MAX = config('OUTBOX_BACKOFF_MAX', default=6 * 60 * 60, cast=int)
+
+# одна пачка за раз: фоновый цикл и ежедневная проверка не возьмут одни и те же письма
+_dispatch_lock = asyncio.Lock()
+
+
+def backoff_delay(attempts: int) -> datetime.timedelta:
+    seconds = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+    return datetime.timedelta(seconds=seconds)
+
+
+async def _send(sender_email: str, app_password: str, item: OutboxEmail):
+    letter = mailer.build_letter(sender_email, item.email, item.subject, item.body)
+    await mailer.deliver(sender_email, app_password, item.email, letter)
+
+
+async def dispatch_batch() -> int:
+    sender_email, app_password = mailer.get_credentials()
+    if not sender_email or not app_password:
+        print("EMAIL или APP_PASSWORD не настроены!")
+        return 0
+
+    async with _dispatch_lock:
+        now = datetime.datetime.now()
+
+        async with async_session() as session:
+            result = await session.execute(
+                select(OutboxEmail).where(
+                    OutboxEmail.status == "PENDING",
+                    OutboxEmail.next_attempt_at <= now
+                ).order_by(OutboxEmail.next_attempt_at, OutboxEmail.id).limit(OUTBOX_BATCH_SIZE)
+            )
+            batch = result.scalars().all()
+
+        if not batch:
+            return 0
+
+        results = await asyncio.gather(
+            *(_send(sender_email, app_password, item) for item in batch),
+            return_exceptions=True
+        )
+
+        now = datetime.datetime.now()
+        changes = []
+        for item, error in zip(batch, results):
+            attempts = item.attempts + 1
+            if error is None:
+                changes.append({"id": item.id, "status": "SENT", "attempts": attempts, "sent_at": now})
+                continue
+
+            change = {"id": item.id, "attempts": attempts, "last_error": str(error)[:500]}
+            # отказ в адресате повторами не лечится
+            if attempts >= OUTBOX_MAX_ATTEMPTS or isinstance(error, smtplib.SMTPRecipientsRefused):
+                change["status"] = "DEAD"
+                print(f"Письмо #{item.id} на {item.email} не отправлено после {attempts} попыток: {error}")
+            else:
+                change["next_attempt_at"] = now + backoff_delay(attempts)
+                print(f"Ошибка отправки письма #{item.id} на {item.email} (попытка {attempts}): {error}")
+            changes.append(change)
+
+        async with async_session() as session:
+            await session.execute(update(OutboxEmail), changes)
+            await session.commit()
+
+        return len(batch)
+
+
+async def drain():
+    while await dispatch_batch() == OUTBOX_BATCH_SIZE:
+        pass
+
+
+async def run_dispatcher():
+    while True:
+        try:
+            await drain()
+        except Exception as e:
+            print(f"Ошибка обработчика очереди писем: {e}")
+
+        await asyncio.sleep(OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,48 @@
+import csv
+import secrets
+from decouple import config
+
+from database.repository import insert_promo_codes
+from services import promo_index
+
+PROMO_BATCH_SIZE = config('PROMO_BATCH_SIZE', default=5000, cast=int)
+PROMO_CODE_LENGTH = config('PROMO_CODE_LENGTH', default=10, cast=int)
+
+# без 0/O и 1/I — код диктуют по телефону и переписывают с листовок.
+# Ровно 32 символа: случайный байт переводится в символ по младшим 5 битам без перекоса
+ALPHABET = b"23456789ABCDEFGHJKLMNPQRSTUVWXYZ"
+_BYTE_TO_SYMBOL = bytes(ALPHABET[byte & 31] for byte in range(256))
+
+
+def generate_codes(count: int, prefix: str = "") -> set[str]:
+    codes = set()
+    while len(codes) < count:
+        missing = count - len(codes)
+        raw = secrets.token_bytes(missing * PROMO_CODE_LENGTH).translate(_BYTE_TO_SYMBOL).decode()
+        codes.update(
+            prefix + raw[i:i + PROMO_CODE_LENGTH]
+            for i in range(0, len(raw), PROMO_CODE_LENGTH)
+        )
+    return codes
+
+
+async def export_promo_batch(path, count: int, discount_percent: int, active_to=None, prefix: str = "") -> int:
+    """Генерирует count уникальных одноразовых кодов и дописывает их в CSV по пачкам.
+
+    В памяти одновременно не больше одной пачки; коды, совпавшие с уже
+    существующими, база отбрасывает, и недостающие генерируются заново.
+    """
+    created = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["code", "discount_percent", "active_to"])
+
+        while created < count:
+            batch = generate_codes(min(PROMO_BATCH_SIZE, count - created), prefix)
+            inserted = await insert_promo_codes(batch, discount_percent, active_to)
+            writer.writerows((code, discount_percent, active_to or "") for code in inserted)
+            created += len(inserted)
+
+    # один сброс на весь выпуск, а не на каждую пачку
+    promo_index.invalidate()
+    return created
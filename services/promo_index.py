@@ -0,0 +1,117 @@
+import asyncio
+import datetime
+import time
+from typing import NamedTuple
+from decouple import config
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+
+from database.models import PromoCode
+from database.session import async_session
+
+PROMO_INDEX_TTL = config('PROMO_INDEX_TTL', default=300, cast=int)
+
+
+class PromoEntry(NamedTuple):
+    code: str  # код в том виде, как он заведён в базе
+    discount_percent: int
+    active_from: datetime.date | None
+    active_to: datetime.date | None
+
+    def is_valid(self, today: datetime.date) -> bool:
+        return (
+            (self.active_from is None or self.active_from <= today)
+            and (self.active_to is None or self.active_to >= today)
+        )
+
+
+_ENTRY = select(PromoCode.code, PromoCode.discount_percent, PromoCode.active_from, PromoCode.active_to)
+# исчерпанные коды не показываем как действующие: redeem_promo всё равно их отклонит
+_USABLE = (
+    PromoCode.is_active == True,
+    or_(PromoCode.max_uses == None, PromoCode.usage_count < PromoCode.max_uses),
+)
+# многоразовые коды держим в памяти целиком; одноразовых из массовых выпусков могут быть
+# сотни тысяч — от них в памяти только хэши, а сам код читается точечным запросом по
+# уникальному индексу code. Опечатки и перебор отсекаются без обращения к базе
+_REUSABLE = or_(PromoCode.max_uses == None, PromoCode.max_uses > 1)
+_SINGLE_USE = PromoCode.max_uses == 1
+
+_codes: dict[str, PromoEntry] = {}
+_single_use: set[int] = set()  # hash(normalize(code)); коллизия стоит лишь лишнего запроса
+_loaded_at: float | None = None
+_generation = 0  # растёт при каждой инвалидации, чтобы не сохранить устаревшую загрузку
+_lock = asyncio.Lock()
+
+
+def normalize(code: str) -> str:
+    return code.strip().casefold()
+
+
+def invalidate():
+    global _loaded_at, _generation
+    _loaded_at = None
+    _generation += 1
+
+
+def mark_changed(session):
+    """Сбросить индекс после коммита транзакции, поменявшей промокоды"""
+    session.info["promo_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("promo_changed", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("promo_changed", None)
+
+
+def _is_fresh() -> bool:
+    return _loaded_at is not None and time.monotonic() - _loaded_at < PROMO_INDEX_TTL
+
+
+async def _refresh():
+    global _codes, _single_use, _loaded_at
+    async with _lock:
+        if _is_fresh():
+            return
+
+        generation = _generation
+        async with async_session() as session:
+            result = await session.execute(_ENTRY.where(*_USABLE, _REUSABLE))
+            codes = {normalize(row.code): PromoEntry(*row) for row in result}
+            result = await session.scalars(select(PromoCode.code).where(*_USABLE, _SINGLE_USE))
+            single_use = {hash(normalize(code)) for code in result}
+
+        _codes, _single_use = codes, single_use
+        if generation == _generation:
+            _loaded_at = time.monotonic()
+
+
+async def _lookup(code: str) -> PromoEntry | None:
+    """Одноразовый код из базы: их печатают заглавными, но вводят как придётся"""
+    code = code.strip()
+    async with async_session() as session:
+        result = await session.execute(
+            _ENTRY.where(PromoCode.code.in_({code, code.upper(), code.lower()}), *_USABLE).limit(1)
+        )
+        row = result.first()
+    return PromoEntry(*row) if row else None
+
+
+async def get_valid_promo(code: str) -> PromoEntry | None:
+    """Действующий сегодня промокод без учёта регистра или None"""
+    if not _is_fresh():
+        await _refresh()
+
+    key = normalize(code)
+    entry = _codes.get(key)
+    if entry is None and hash(key) in _single_use:
+        entry = await _lookup(code)
+    if entry and entry.is_valid(datetime.date.today()):
+        return entry
+    return None
@@ -0,0 +1,80 @@
+"""QR-коды для оплаты и выдачи вещей: PNG в памяти, рендер вне цикла событий и повторная отправка по file_id"""
+import asyncio
+import io
+from collections import OrderedDict
+from decouple import config
+import qrcode
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, Message
+
+QR_CACHE_SIZE = config('QR_CACHE_SIZE', default=1024, cast=int)
+
+# содержимое QR -> PNG, пока картинка ещё не загружена в Telegram
+_images: OrderedDict[str, bytes] = OrderedDict()
+# содержимое QR -> file_id загруженной картинки; повторная отправка не стоит ни CPU, ни трафика
+_file_ids: OrderedDict[str, str] = OrderedDict()
+# рендеры в работе: одновременные нажатия на одну кнопку рисуют картинку один раз
+_rendering: dict[str, asyncio.Future] = {}
+
+
+def _remember(cache: OrderedDict, payload: str, value):
+    cache[payload] = value
+    cache.move_to_end(payload)
+    if len(cache) > QR_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def render(payload: str) -> bytes:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def png(payload: str) -> bytes:
+    """PNG с QR-кодом; рисуется в потоке, чтобы не останавливать обработку других апдейтов"""
+    image = _images.get(payload)
+    if image is not None:
+        _images.move_to_end(payload)
+        return image
+
+    if payload in _rendering:
+        return await asyncio.shield(_rendering[payload])
+
+    future = asyncio.ensure_future(asyncio.to_thread(render, payload))
+    _rendering[payload] = future
+    try:
+        image = await asyncio.shield(future)
+    finally:
+        _rendering.pop(payload, None)
+
+    _remember(_images, payload, image)
+    return image
+
+
+async def answer_qr(message: Message, payload: str, **kwargs) -> Message:
+    """Отправляет QR-код в чат message; картинку, уже бывшую в Telegram, — по file_id"""
+    file_id = _file_ids.get(payload)
+    if file_id is not None:
+        _file_ids.move_to_end(payload)
+        try:
+            return await message.answer_photo(photo=file_id, **kwargs)
+        except TelegramBadRequest:
+            # file_id протух или не подходит этому боту — загружаем заново
+            _file_ids.pop(payload, None)
+
+    image = await png(payload)
+    sent = await message.answer_photo(photo=BufferedInputFile(image, filename="qr.png"), **kwargs)
+    if sent.photo:
+        _remember(_file_ids, payload, sent.photo[-1].file_id)
+        _images.pop(payload, None)
+    return sent
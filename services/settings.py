@@ -0,0 +1,250 @@
+"""Настройки из config.json: проверка при загрузке, неизменяемые объекты и перечитывание без перезапуска"""
+import asyncio
+import datetime
+import inspect
+import json
+import os
+from pathlib import Path
+from types import MappingProxyType
+from typing import Callable, Mapping, NamedTuple
+from decouple import config
+
+from config import BASE_DIR, CONFIG_PATH
+
+# как часто проверять, не изменился ли config.json
+CONFIG_POLL_INTERVAL = config('CONFIG_POLL_INTERVAL', default=5, cast=float)
+
+
+class ConfigError(ValueError):
+    """config.json не прошёл проверку"""
+
+
+class Box(NamedTuple):
+    id: str
+    name: str
+    size: str
+    dimensions: str
+    price_per_month: int
+    description: str
+
+
+class Delivery(NamedTuple):
+    self_delivery_discount: float  # множитель цены при самовывозе
+    pickup_service_base: int
+    pickup_per_km: int
+
+
+class Reminders(NamedTuple):
+    expiring_days: tuple[int, ...]
+    overdue_days: tuple[int, ...]
+    dispose_after_days: int
+
+
+class PromoSeed(NamedTuple):
+    code: str
+    discount_percent: int
+    active_from: datetime.date | None
+    active_to: datetime.date | None
+
+
+class Settings(NamedTuple):
+    boxes: tuple[Box, ...]
+    boxes_by_id: Mapping[str, Box]
+    delivery: Delivery
+    prohibited_keywords: tuple[str, ...]
+    allowed_keywords: tuple[str, ...]
+    prohibited_reasons: Mapping[str, str]
+    reminders: Reminders
+    promo_seeds: tuple[PromoSeed, ...]
+    manager_phone: str
+    manager_tg_ids: frozenset[int]
+    warehouse_address: str
+    pd_pdf_path: Path
+
+
+def _get(section: dict, key: str, kind, where: str):
+    value = section.get(key) if isinstance(section, dict) else None
+    # bool — подкласс int, но «true» вместо цены почти наверняка ошибка
+    if not isinstance(value, kind) or isinstance(value, bool):
+        names = kind.__name__ if isinstance(kind, type) else "/".join(k.__name__ for k in kind)
+        raise ConfigError(f"{where}.{key}: ожидается {names}, получено {value!r}")
+    return value
+
+
+def _positive_ints(section: dict, key: str, where: str) -> tuple[int, ...]:
+    values = _get(section, key, list, where)
+    if not values or not all(isinstance(v, int) and not isinstance(v, bool) and v > 0 for v in values):
+        raise ConfigError(f"{where}.{key}: ожидается непустой список положительных чисел")
+    return tuple(values)
+
+
+def _strings(section: dict, key: str, where: str) -> tuple[str, ...]:
+    values = _get(section, key, list, where)
+    if not all(isinstance(v, str) and v.strip() for v in values):
+        raise ConfigError(f"{where}.{key}: ожидается список непустых строк")
+    return tuple(values)
+
+
+def _date(value, where: str) -> datetime.date | None:
+    if value is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{where}: ожидается дата ГГГГ-ММ-ДД, получено {value!r}")
+
+
+def _parse_boxes(tariffs: dict) -> tuple[Box, ...]:
+    boxes = []
+    for index, raw in enumerate(_get(tariffs, "boxes", list, "tariffs")):
+        where = f"tariffs.boxes[{index}]"
+        box = Box(
+            id=_get(raw, "id", str, where),
+            name=_get(raw, "name", str, where),
+            size=_get(raw, "size", str, where),
+            dimensions=_get(raw, "dimensions", str, where),
+            price_per_month=_get(raw, "price_per_month", int, where),
+            description=_get(raw, "description", str, where),
+        )
+        if box.price_per_month <= 0:
+            raise ConfigError(f"{where}.price_per_month: цена должна быть положительной")
+        boxes.append(box)
+
+    if not boxes:
+        raise ConfigError("tariffs.boxes: нужен хотя бы один бокс")
+    ids = [box.id for box in boxes]
+    if len(set(ids)) != len(ids):
+        raise ConfigError(f"tariffs.boxes: повторяются id {sorted({i for i in ids if ids.count(i) > 1})}")
+    return tuple(boxes)
+
+
+def _parse_delivery(tariffs: dict) -> Delivery:
+    raw = _get(tariffs, "delivery", dict, "tariffs")
+    delivery = Delivery(
+        self_delivery_discount=float(_get(raw, "self_delivery_discount", (int, float), "tariffs.delivery")),
+        pickup_service_base=_get(raw, "pickup_service_base", int, "tariffs.delivery"),
+        pickup_per_km=_get(raw, "pickup_per_km", int, "tariffs.delivery"),
+    )
+    if not 0 < delivery.self_delivery_discount <= 1:
+        raise ConfigError("tariffs.delivery.self_delivery_discount: ожидается множитель от 0 до 1")
+    if delivery.pickup_service_base < 0 or delivery.pickup_per_km < 0:
+        raise ConfigError("tariffs.delivery: стоимость доставки не может быть отрицательной")
+    return delivery
+
+
+def _parse_promo_seeds(raw: dict) -> tuple[PromoSeed, ...]:
+    seeds = []
+    items = _get(raw, "promo_codes", list, "config") if "promo_codes" in raw else []
+    for index, item in enumerate(items):
+        where = f"promo_codes[{index}]"
+        seed = PromoSeed(
+            code=_get(item, "code", str, where),
+            discount_percent=_get(item, "discount_percent", int, where),
+            active_from=_date(item.get("active_from"), f"{where}.active_from"),
+            active_to=_date(item.get("active_to"), f"{where}.active_to"),
+        )
+        if not 0 < seed.discount_percent <= 100:
+            raise ConfigError(f"{where}.discount_percent: ожидается число от 1 до 100")
+        if seed.active_from and seed.active_to and seed.active_from > seed.active_to:
+            raise ConfigError(f"{where}: active_from позже active_to")
+        seeds.append(seed)
+    return tuple(seeds)
+
+
+def parse(raw: dict) -> Settings:
+    """Проверяет содержимое config.json и собирает из него Settings"""
+    meta = _get(raw, "meta", dict, "config")
+    keywords = _get(raw, "keywords", dict, "config")
+    tariffs = _get(raw, "tariffs", dict, "config")
+    reminders = _get(raw, "reminders", dict, "config")
+
+    reasons = keywords.get("prohibited_reasons", {})
+    if not isinstance(reasons, dict) or not all(isinstance(v, str) for v in reasons.values()):
+        raise ConfigError("keywords.prohibited_reasons: ожидается словарь «слово: причина»")
+
+    manager_ids = _get(meta, "manager_telegram_id", list, "meta")
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in manager_ids):
+        raise ConfigError("meta.manager_telegram_id: ожидается список числовых id")
+
+    pd_agreement = _get(meta, "pd_agreement", dict, "meta")
+    boxes = _parse_boxes(tariffs)
+    return Settings(
+        boxes=boxes,
+        boxes_by_id=MappingProxyType({box.id: box for box in boxes}),
+        delivery=_parse_delivery(tariffs),
+        prohibited_keywords=_strings(keywords, "prohibited_keywords", "keywords"),
+        allowed_keywords=_strings(keywords, "allowed_keywords", "keywords"),
+        prohibited_reasons=MappingProxyType(dict(reasons)),
+        reminders=Reminders(
+            expiring_days=_positive_ints(reminders, "expiring_days", "reminders"),
+            overdue_days=_positive_ints(reminders, "overdue_days", "reminders"),
+            dispose_after_days=_get(reminders, "dispose_after_days", int, "reminders"),
+        ),
+        promo_seeds=_parse_promo_seeds(raw),
+        manager_phone=_get(meta, "manager_phone", str, "meta"),
+        manager_tg_ids=frozenset(manager_ids),
+        warehouse_address=_get(meta, "warehouse_address", str, "meta"),
+        pd_pdf_path=BASE_DIR / "data" / _get(pd_agreement, "pdf_file", str, "meta.pd_agreement"),
+    )
+
+
+def load(path: Path = CONFIG_PATH) -> Settings:
+    with open(path, "r", encoding="utf-8") as f:
+        return parse(json.load(f))
+
+
+_current = load()
+_callbacks: list[Callable] = []
+
+
+def current() -> Settings:
+    """Актуальные настройки; читать при каждом обращении, а не сохранять в модуле"""
+    return _current
+
+
+def on_reload(callback: Callable):
+    """Вызывать callback(settings) после каждой успешной перезагрузки; может быть корутиной"""
+    _callbacks.append(callback)
+    return callback
+
+
+async def reload(path: Path = CONFIG_PATH) -> Settings:
+    """Перечитывает файл; при ошибке проверки остаются прежние настройки"""
+    global _current
+    settings = load(path)
+    # подмена одной ссылкой: обработчики видят либо старые, либо новые настройки целиком
+    _current = settings
+    for callback in _callbacks:
+        try:
+            result = callback(settings)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"Ошибка при применении новых настроек в {callback.__qualname__}: {e}")
+    return settings
+
+
+def _stamp(path: Path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+async def watch(path: Path = CONFIG_PATH, interval: float = CONFIG_POLL_INTERVAL):
+    """Следит за config.json и применяет изменения без перезапуска бота"""
+    stamp = _stamp(path)
+    while True:
+        await asyncio.sleep(interval)
+        new_stamp = _stamp(path)
+        if new_stamp is None or new_stamp == stamp:
+            continue
+        stamp = new_stamp
+
+        try:
+            await reload(path)
+        except (OSError, ValueError) as e:
+            print(f"config.json не применён, работаем на прежних настройках: {e}")
+            continue
+        print("config.json перечитан, новые настройки применены")
@@ -0,0 +1,143 @@
+"""Приём апдейтов через вебхук: быстрый ответ Telegram и ограниченная очередь принятых апдейтов"""
+import asyncio
+import hmac
+import json
+import signal
+from contextlib import suppress
+from decouple import config
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+WEBHOOK_PATH = config('WEBHOOK_PATH', default='/webhook')
+WEBHOOK_HOST = config('WEBHOOK_HOST', default='0.0.0.0')
+WEBHOOK_PORT = config('WEBHOOK_PORT', default=8080, cast=int)
+WEBHOOK_SECRET = config('WEBHOOK_SECRET', default='')
+# сколько принятых апдейтов может ждать обработки; сколько из них обрабатывается
+# одновременно, задаёт UPDATE_CONCURRENCY в middlewares/scheduler.py
+WEBHOOK_QUEUE_SIZE = config('WEBHOOK_QUEUE_SIZE', default=1024, cast=int)
+# столько ждём места в очереди, прежде чем ответить Telegram 503 — он повторит доставку позже
+WEBHOOK_ENQUEUE_TIMEOUT = config('WEBHOOK_ENQUEUE_TIMEOUT', default=5.0, cast=float)
+WEBHOOK_MAX_CONNECTIONS = config('WEBHOOK_MAX_CONNECTIONS', default=40, cast=int)
+
+
+class UpdateQueue:
+    """Принятые вебхуком апдейты: каждый обрабатывается своей задачей, как при polling.
+
+    Очередь только ограничивает число принятых и ещё не обработанных апдейтов.
+    Порядок внутри чата и общий предел параллельности обеспечивает ChatSchedulerMiddleware.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        enqueue_timeout: float = WEBHOOK_ENQUEUE_TIMEOUT,
+    ):
+        self._dp = dp
+        self._bot = bot
+        self.queue_size = queue_size
+        self._enqueue_timeout = enqueue_timeout
+        # когда места нет, вебхук не отвечает 200
+        self._slots = asyncio.Semaphore(queue_size)
+        self._tasks: set[asyncio.Task] = set()
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._tasks)
+
+    async def submit(self, update: Update) -> bool:
+        """Берёт апдейт в обработку; False — место в очереди так и не освободилось"""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _process(self, update: Update):
+        try:
+            await self._dp.feed_update(self._bot, update)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Ошибка при обработке апдейта {update.update_id}: {e}")
+        finally:
+            self._slots.release()
+
+    async def stop(self):
+        """Дожидается обработки всего, что уже принято"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def build_app(bot: Bot, queue: UpdateQueue, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        if secret and not hmac.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), secret):
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": bot})
+        except (json.JSONDecodeError, ValueError):
+            return web.Response(status=400)
+
+        # отвечаем сразу после постановки в очередь: обработка идёт уже без Telegram
+        if not await queue.submit(update):
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    url: str | None = None,
+    host: str = WEBHOOK_HOST,
+    port: int = WEBHOOK_PORT,
+    path: str = WEBHOOK_PATH,
+    secret: str = WEBHOOK_SECRET,
+):
+    """Аналог dp.start_polling для режима вебхука: работает до SIGINT/SIGTERM.
+    Порядок апдейтов внутри чата держит ChatSchedulerMiddleware, зарегистрированный в dp"""
+    url = url or config('WEBHOOK_URL')
+
+    queue = UpdateQueue(dp, bot)
+    runner = web.AppRunner(build_app(bot, queue, path, secret))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    await bot.set_webhook(
+        url.rstrip("/") + path,
+        secret_token=secret or None,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=WEBHOOK_MAX_CONNECTIONS
+    )
+    print(f"Вебхук слушает {host}:{port}{path}, очередь: {queue.queue_size} апдейтов")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        # сначала перестаём принимать, потом дорабатываем принятое; вебхук не снимаем —
+        # Telegram придержит новые апдейты до перезапуска
+        await runner.cleanup()
+        await queue.stop()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()